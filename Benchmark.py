@@ -0,0 +1,229 @@
+# coding: utf-8
+
+"""
+    Mesures de performance de l'indexation et de l'interrogation
+
+    Un corpus synthétique au format CACM (.I/.T/.A/.K/.W/.X) est généré pour
+    chaque taille demandée, de sorte que les mesures ne dépendent pas de
+    cacm.txt. Chaque taille est mesurée dans un processus séparé (pic de
+    mémoire propre à la taille) et les résultats sont écrits en JSON pour
+    être comparés d'un commit à l'autre.
+
+    Utilisation : python Benchmark.py [-s 1000 10000] [-o bench.json] [-e binary]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import resource
+import argparse
+import platform
+import tempfile
+import itertools
+import subprocess
+import multiprocessing
+import logging
+import porter
+import Index
+import IRmodel
+import ParserCACM
+import TextRepresenter
+
+
+_syllables = ["ka", "to", "ri", "mu", "ne", "sa", "lo", "pi", "de", "vu", "ga", "be", "tra", "con", "ex"]
+_suffixes = ["", "", "", "s", "ed", "ing", "ation", "ness", "ful", "ly", "ize", "ement", "ive", "ous"]
+
+
+def generateCorpus(path, nbDocs, nbWords=30000, seed=0):
+    """
+        Génère un corpus synthétique au format CACM
+
+        Le vocabulaire est formé de syllabes et de suffixes anglais (pour
+        faire travailler le stemmer) ; les mots sont tirés selon une loi de
+        Zipf, comme dans un corpus réel.
+
+        :param path: Fichier à écrire
+        :param nbDocs: Nombre de documents
+        :param nbWords: Taille du vocabulaire
+        :param seed: Graine du générateur aléatoire
+        :type  path: str
+        :type  nbDocs: int
+        :type  nbWords: int
+        :type  seed: int
+    """
+
+    rand = random.Random(seed)
+    vocabulary = ["".join(rand.choices(_syllables, k=rand.randint(1, 4))) + rand.choice(_suffixes)
+                  for _ in range(nbWords)]
+    cum = list(itertools.accumulate(1 / r for r in range(1, nbWords + 1)))
+
+    def words(a, b):
+        return " ".join(rand.choices(vocabulary, cum_weights=cum, k=rand.randint(a, b)))
+
+    with open(path, "w") as f:
+        for i in range(1, nbDocs + 1):
+            f.write(".I " + str(i) + "\n.T\n" + words(4, 10) + "\n.A\n" + words(1, 2) + "\n.K\n" + words(0, 4)
+                    + "\n.W\n" + words(40, 250) + "\n.X\n" + str(i) + "\t5\t" + str(i) + "\n")
+
+
+def timeCalls(function, args):
+    """
+        Mesure la latence de chaque appel d'une fonction
+
+        :param function: Fonction à appeler
+        :param args: Argument de chaque appel
+        :type  function: callable
+        :type  args: list
+        :return: Latence moyenne, médiane et 99e centile, en microsecondes
+        :rtype: dict
+    """
+
+    latencies = []
+    for a in args:
+        start = time.perf_counter()
+        function(a)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    return {
+        "mean": sum(latencies) / len(latencies),
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[int(len(latencies) * 0.99)],
+    }
+
+
+def benchmark(nbDocs, encoding="text", seed=0):
+    """
+        Mesure l'indexation et l'interrogation d'un corpus synthétique
+
+        :param nbDocs: Nombre de documents du corpus
+        :param encoding: Format de l'index
+        :param seed: Graine du générateur aléatoire
+        :type  nbDocs: int
+        :type  encoding: str
+        :type  seed: int
+        :rtype: dict
+    """
+
+    result = {"docs": nbDocs, "encoding": encoding}
+    rand = random.Random(seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        generateCorpus("corpus.txt", nbDocs, seed=seed)
+        result["corpusBytes"] = os.path.getsize("corpus.txt")
+
+        # Indexation
+        index = Index.Index("bench", ParserCACM.ParserCACM(), TextRepresenter.PorterStemmer(), "corpus.txt",
+                            encoding=encoding)
+        start = time.perf_counter()
+        index.indexDirect()
+        direct = time.perf_counter() - start
+        start = time.perf_counter()
+        index.prepareInversed()
+        index.indexInversed()
+        inversed = time.perf_counter() - start
+        del index.shapes, index.ordinals
+        index.save()
+
+        postings = sum(index.stemDfs)
+        result["stems"] = len(index.stemIds)
+        result["postings"] = postings
+        result["indexDirect"] = {"seconds": direct, "docsPerSecond": nbDocs / direct}
+        result["indexInversed"] = {"seconds": inversed, "postingsPerSecond": postings / inversed}
+        result["diskBytes"] = {suffix: os.path.getsize("bench" + suffix) for suffix in ("_index", "_inverted", "_meta",
+                                                                                        "_lexicon", "_skips")}
+
+        # Interrogation d'un index rouvert
+        index = Index.Index.open("bench", TextRepresenter.PorterStemmer())
+        stems = rand.choices(index.stemIds, k=1000)
+        result["getTfsForStem"] = timeCalls(index.getTfsForStem, stems)
+        with index:
+            result["getTfsForStemMapped"] = timeCalls(index.getTfsForStem, stems)
+
+            # Requêtes de deux termes fréquents : union, puis intersection par curseurs
+            model = IRmodel.Okapi(index)
+            common = sorted(index.stemIds, key=index.getDf)[-100:]
+            queries = [" ".join(rand.sample(common, 2)) for _ in range(200)]
+            result["getRanking"] = timeCalls(lambda q: model.getRanking(q, 10), queries)
+            result["getRankingConjunctive"] = timeCalls(lambda q: model.getRanking(q, 10, conjunctive=True), queries)
+
+        # Représentation des textes, cache du stemmer froid
+        parser = ParserCACM.ParserCACM()
+        parser.initFile("corpus.txt")
+        texts = [d.getText() for d, _ in zip(parser.iterDocuments(), range(1000))]
+        words = [w for text in texts for w in text.lower().split() if w.isalpha()]
+        textRep = TextRepresenter.PorterStemmer()
+        start = time.perf_counter()
+        for text in texts:
+            textRep.getTextRepresentation(text)
+        result["getTextRepresentation"] = {"docsPerSecond": len(texts) / (time.perf_counter() - start)}
+        for name, stem in porter.backends.items():
+            start = time.perf_counter()
+            for w in words:
+                stem(w)
+            result["porter." + name] = {"wordsPerSecond": len(words) / (time.perf_counter() - start)}
+
+    result["peakRssKb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def commit():
+    """
+        Retourne le commit courant du dépôt (None hors d'un dépôt git)
+
+        :rtype: str
+    """
+
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, encoding="text", seed=0):
+    """
+        Mesure chaque taille de corpus dans un processus séparé
+
+        :param sizes: Nombres de documents
+        :param encoding: Format de l'index
+        :param seed: Graine du générateur aléatoire
+        :type  sizes: list
+        :type  encoding: str
+        :type  seed: int
+        :rtype: dict
+    """
+
+    results = []
+    for n in sizes:
+        with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+            results.append(pool.apply(benchmark, (n, encoding, seed)))
+        sys.stderr.write(str(n) + " documents : " + str(int(results[-1]["indexDirect"]["docsPerSecond"])) + " docs/s, "
+                         + str(int(results[-1]["indexInversed"]["postingsPerSecond"])) + " postings/s\n")
+
+    return {
+        "commit": commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Mesures de performance de l'indexation et de l'interrogation")
+    args.add_argument("-s", "--sizes", type=int, nargs="+", default=[1000, 3000, 10000], help="nombres de documents")
+    args.add_argument("-e", "--encoding", default="text", choices=["text", "binary"], help="format de l'index")
+    args.add_argument("-o", "--output", help="fichier JSON des résultats (sortie standard par défaut)")
+    args.add_argument("--seed", type=int, default=0, help="graine du générateur aléatoire")
+    args = args.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    report = json.dumps(run(args.sizes, args.encoding, args.seed), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        sys.stdout.write(report + "\n")
@@ -0,0 +1,148 @@
+# coding: utf-8
+
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+        LRUCache
+
+        Cache LRU borné par la mémoire occupée par ses valeurs, en octets,
+        et non par leur nombre. Les accès sont protégés par un verrou : le
+        cache peut être partagé entre plusieurs fils d'exécution.
+
+        Si une durée de vie est donnée, une valeur plus ancienne est
+        considérée comme absente et retirée lors de sa lecture.
+    """
+
+    def __init__(self, budget, sizeof=None, ttl=None):
+        """
+            Initialise un objet LRUCache
+
+            :param budget: Mémoire maximale occupée par les valeurs, en octets
+            :param sizeof: Fonction retournant la taille d'une valeur (sys.getsizeof par défaut)
+            :param ttl: Durée de vie d'une valeur, en secondes (illimitée par défaut)
+            :type budget: int
+            :type sizeof: callable
+            :type ttl: float
+        """
+
+        self.budget = budget
+        self.sizeof = sizeof or sys.getsizeof
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # Le contenu et le verrou ne sont pas transmis aux processus de travail
+        return {"budget": self.budget, "sizeof": self.sizeof, "ttl": self.ttl}
+
+    def __setstate__(self, state):
+        self.__init__(state["budget"], state["sizeof"], state.get("ttl"))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+            Retourne la valeur associée à une clé (None si elle est absente)
+
+            :param key: Clé recherchée
+            :type key: hashable
+        """
+
+        with self.lock:
+            try:
+                value, size, expiry = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            if expiry is not None and expiry <= time.monotonic():
+                del self.entries[key]
+                self.size -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """
+            Ajoute une valeur, en évinçant les moins récemment utilisées
+
+            Une valeur plus grande que le budget n'est pas conservée.
+
+            :param key: Clé de la valeur
+            :param value: Valeur à conserver
+            :type key: hashable
+        """
+
+        size = self.sizeof(value)
+        if size > self.budget:
+            return
+        expiry = None if self.ttl is None else time.monotonic() + self.ttl
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size, expiry)
+            self.size += size
+            while self.size > self.budget:
+                self.size -= self.entries.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def clear(self):
+        """
+            Vide le cache (les statistiques sont conservées)
+        """
+
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def info(self):
+        """
+            Retourne les statistiques du cache
+
+            :return: Succès, échecs, évictions, expirations, nombre
+                     d'entrées, mémoire occupée et budget
+            :rtype: dict
+        """
+
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "expirations": self.expirations, "entries": len(self.entries), "size": self.size,
+                    "budget": self.budget}
+
+
+def sizeofPostings(postings):
+    """
+        Retourne la taille en mémoire d'une liste de postings (ordinaux, tfs)
+
+        :param postings: Tableaux des ordinaux et des tfs
+        :type postings: tuple(array, array)
+        :rtype: int
+    """
+
+    ords, tfs = postings
+    return sys.getsizeof(postings) + sys.getsizeof(ords) + sys.getsizeof(tfs)
+
+
+def sizeofRanking(ranking):
+    """
+        Retourne la taille en mémoire d'un classement [(document, score), ...]
+
+        :param ranking: Couples (document, score)
+        :type ranking: list
+        :rtype: int
+    """
+
+    return sys.getsizeof(ranking) + sum(sys.getsizeof(r) + sys.getsizeof(r[0]) + sys.getsizeof(r[1]) for r in ranking)
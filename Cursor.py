@@ -0,0 +1,136 @@
+# coding: utf-8
+
+"""
+    Curseurs sur les listes de postings découpées en blocs
+
+    Une liste est décrite par ses blocs : ordinaux du premier et du dernier
+    document, tf maximal, longueur minimale des documents et fonction de
+    décodage (voir Index.getBlocks()). Un bloc n'est décodé que lorsque le
+    curseur s'y arrête : advance() saute les blocs qui précèdent le document
+    visé par une simple recherche dichotomique sur les derniers ordinaux, et
+    le tf maximal et la longueur minimale d'un bloc permettent de majorer
+    les scores de ses documents sans le décoder.
+"""
+
+from bisect import bisect_left
+
+# Supérieur à tout ordinal de document : position d'un curseur épuisé
+END = 1 << 32
+
+
+class Cursor(object):
+    """
+        Cursor
+
+        Curseur parcourant une liste de postings dans l'ordre des ordinaux.
+        Le document courant est Cursor.doc (END une fois la liste épuisée)
+        et son tf Cursor.tf.
+    """
+
+    def __init__(self, blocks):
+        """
+            Initialise un objet Cursor, positionné sur le premier posting
+
+            :param blocks: Quintuplets (premier ordinal, dernier ordinal, tf
+                           maximal, longueur minimale des documents,
+                           fonction de décodage) dans l'ordre des ordinaux ;
+                           la fonction retourne les ordinaux et les tfs du
+                           bloc
+            :type blocks: list
+        """
+
+        self.firsts = [b[0] for b in blocks]
+        self.lasts = [b[1] for b in blocks]
+        self.maxTfs = [b[2] for b in blocks]
+        self.minLengths = [b[3] for b in blocks]
+        self.loaders = [b[4] for b in blocks]
+        self.block = -1
+        self.ords = ()
+        self.tfs = ()
+        self.pos = 0
+        self.doc = END
+        self.tf = 0
+        self.load(0)
+
+    def load(self, j):
+        """
+            Décode un bloc et se positionne sur son premier posting
+
+            Un bloc vidé par des suppressions est passé.
+
+            :param j: Numéro du bloc
+            :type j: int
+            :return: Document courant
+            :rtype: int
+        """
+
+        while j < len(self.loaders):
+            ords, tfs = self.loaders[j]()
+            if len(ords):
+                self.block, self.ords, self.tfs, self.pos = j, ords, tfs, 0
+                self.doc, self.tf = ords[0], tfs[0]
+                return self.doc
+            j += 1
+        self.block, self.ords, self.tfs, self.pos = len(self.loaders), (), (), 0
+        self.doc, self.tf = END, 0
+        return END
+
+    def next(self):
+        """
+            Passe au posting suivant
+
+            :return: Document courant
+            :rtype: int
+        """
+
+        self.pos += 1
+        if self.pos < len(self.ords):
+            self.doc, self.tf = self.ords[self.pos], self.tfs[self.pos]
+            return self.doc
+        return self.load(self.block + 1)
+
+    def advance(self, target):
+        """
+            Avance jusqu'au premier document d'ordinal supérieur ou égal à target
+
+            Les blocs dont le dernier ordinal précède target sont passés
+            sans être décodés.
+
+            :param target: Ordinal visé
+            :type target: int
+            :return: Document courant
+            :rtype: int
+        """
+
+        if target <= self.doc:
+            return self.doc
+        if target > self.lasts[self.block]:
+            j = bisect_left(self.lasts, target, self.block + 1)
+            if self.load(j) >= target:
+                return self.doc
+        p = bisect_left(self.ords, target, self.pos)
+        if p == len(self.ords):
+            return self.load(self.block + 1)
+        self.pos = p
+        self.doc, self.tf = self.ords[p], self.tfs[p]
+        return self.doc
+
+    def shallow(self, target):
+        """
+            Retourne le bloc susceptible de contenir target, sans le décoder
+
+            Le bloc retourné est le premier, à partir du bloc courant, dont
+            le dernier ordinal n'est pas inférieur à target : les documents
+            de la liste compris entre target et ce dernier ordinal sont tous
+            dans ce bloc.
+
+            :param target: Ordinal visé
+            :type target: int
+            :return: Numéro du bloc (nombre de blocs si la liste ne contient
+                     aucun document à partir de target)
+            :rtype: int
+        """
+
+        if self.block < len(self.lasts) and target <= self.lasts[self.block]:
+            return self.block
+        return bisect_left(self.lasts, target, max(0, self.block))
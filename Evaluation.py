@@ -0,0 +1,249 @@
+# coding: utf-8
+
+import math
+import time
+import multiprocessing
+import logging
+from ParserQuery import normalizeId
+log = logging.getLogger(__name__)
+
+
+
+class EvalMeasure(object):
+    """
+        EvalMeasure
+
+        Mesure de la qualité du classement d'une requête.
+    """
+
+    name = ""
+
+    def evaluate(self, ranking, relevants):
+        """
+            Évalue le classement retourné pour une requête
+
+            :param ranking: Identifiants des documents classés
+            :param relevants: Identifiants des documents pertinents
+            :type  ranking: list
+            :type  relevants: set
+            :rtype: float
+        """
+        raise NotImplementedError
+
+
+
+class AveragePrecision(EvalMeasure):
+    """
+        Précision moyenne (sa moyenne sur les requêtes est la MAP)
+    """
+
+    name = "MAP"
+
+    def evaluate(self, ranking, relevants):
+        found = 0
+        total = 0
+        for rank, doc in enumerate(ranking, 1):
+            if doc in relevants:
+                found += 1
+                total += found / rank
+        return total / len(relevants)
+
+
+
+class PrecisionAtK(EvalMeasure):
+    """
+        Proportion de documents pertinents parmi les k premiers
+    """
+
+    def __init__(self, k):
+        """
+            :param k: Rang de coupure
+            :type  k: int
+        """
+        self.k = k
+        self.name = "P@" + str(k)
+
+    def evaluate(self, ranking, relevants):
+        return sum(1 for doc in ranking[:self.k] if doc in relevants) / self.k
+
+
+
+class NDCG(EvalMeasure):
+    """
+        Gain cumulé actualisé normalisé des k premiers documents
+
+        Les jugements de CACM et CISI sont binaires : chaque document
+        pertinent a un gain de 1.
+    """
+
+    def __init__(self, k):
+        """
+            :param k: Rang de coupure
+            :type  k: int
+        """
+        self.k = k
+        self.name = "nDCG@" + str(k)
+
+    def evaluate(self, ranking, relevants):
+        dcg = sum(1 / math.log2(rank + 1) for rank, doc in enumerate(ranking[:self.k], 1) if doc in relevants)
+        ideal = sum(1 / math.log2(rank + 1) for rank in range(1, min(self.k, len(relevants)) + 1))
+        return dcg / ideal
+
+
+
+class EvalIRModel(object):
+    """
+        EvalIRModel
+
+        Évaluation d'un modèle sur un lot de requêtes : qualité des
+        classements (moyenne de chaque mesure sur les requêtes ayant des
+        documents pertinents) et latence par requête.
+    """
+
+    def __init__(self, model, measures=None, k=1000, workers=1, fielded=False):
+        """
+            Initialise un objet EvalIRModel
+
+            :param model: Modèle à évaluer
+            :param measures: Mesures à calculer (MAP, P@5, P@10, nDCG@10 par défaut)
+            :param k: Nombre de documents retournés par requête
+            :param workers: Nombre de processus exécutant les requêtes
+            :param fielded: Utilise le texte des requêtes réécrit pour un
+                            index à champs (voir ParserQuery)
+            :type  model: IRmodel
+            :type  measures: list
+            :type  k: int
+            :type  workers: int
+            :type  fielded: bool
+        """
+
+        self.model = model
+        self.measures = measures or [AveragePrecision(), PrecisionAtK(5), PrecisionAtK(10), NDCG(10)]
+        self.k = k
+        self.workers = workers
+        self.fielded = fielded
+
+    def run(self, queries):
+        """
+            Exécute les requêtes et retourne leur classement et leur latence
+
+            Avec plusieurs processus, le modèle n'est transmis qu'une fois à
+            chaque processus ; la latence est mesurée dans le processus qui
+            exécute la requête.
+
+            :param queries: Requêtes lues par ParserQuery
+            :type  queries: list
+            :return: Couples (classement, latence en secondes) dans l'ordre des requêtes
+            :rtype: list
+        """
+
+        texts = [q.get("fielded") if self.fielded else q.getText() for q in queries]
+        if self.workers > 1:
+            with multiprocessing.Pool(self.workers, initWorker, (self.model, self.k)) as pool:
+                return pool.map(rankQuery, texts, chunksize=max(1, len(texts) // (4 * self.workers)))
+        return [timeRanking(self.model, text, self.k) for text in texts]
+
+    def evaluate(self, queries):
+        """
+            Évalue le modèle sur un lot de requêtes
+
+            :param queries: Requêtes lues par ParserQuery
+            :type  queries: list
+            :return: Moyenne de chaque mesure, centiles de latence (en
+                     millisecondes), débit (requêtes par seconde) et détail
+                     par requête
+            :rtype: dict
+        """
+
+        log_start = time.time()
+        results = self.run(queries)
+        elapsed = time.time() - log_start
+
+        # Identifiants des documents classés et des jugements normalisés de la même façon
+        perQuery = {}
+        judged = []
+        for q, (ranking, latency) in zip(queries, results):
+            ranking = [normalizeId(doc) for doc in ranking]
+            relevants = {normalizeId(doc) for doc in q.get("relevants")}
+            scores = {m.name: m.evaluate(ranking, relevants) for m in self.measures} if relevants else {}
+            scores["latency"] = latency * 1000
+            perQuery[normalizeId(q.getId())] = scores
+            if relevants:
+                judged.append(scores)
+
+        latencies = sorted(scores["latency"] for scores in perQuery.values())
+
+        report = {m.name: sum(scores[m.name] for scores in judged) / max(1, len(judged)) for m in self.measures}
+        report.update({"p" + str(p): percentile(latencies, p) for p in (50, 90, 99)})
+        report["queries"] = len(queries)
+        report["judged"] = len(judged)
+        report["throughput"] = len(queries) / elapsed if elapsed else 0
+        report["perQuery"] = perQuery
+
+        log.info(" ".join(name + " " + str(round(report[name], 4))
+                          for name in [m.name for m in self.measures] + ["p50", "p90", "p99", "throughput"]) + "\n")
+        return report
+
+
+def percentile(values, p):
+    """
+        Retourne le centile p (méthode du rang le plus proche)
+
+        :param values: Valeurs triées
+        :param p: Centile, entre 0 et 100
+        :type  values: list
+        :type  p: float
+        :rtype: float
+    """
+
+    if not values:
+        return 0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def timeRanking(model, text, k):
+    """
+        Exécute une requête et mesure sa latence
+
+        :param model: Modèle à interroger
+        :param text: Texte de la requête
+        :param k: Nombre de documents retournés
+        :type  model: IRmodel
+        :type  text: str
+        :type  k: int
+        :return: Identifiants des documents classés et latence en secondes
+        :rtype: tuple
+    """
+
+    start = time.perf_counter()
+    ranking = model.getRanking(text, k)
+    return [doc for doc, score in ranking], time.perf_counter() - start
+
+
+worker = {}
+
+
+def initWorker(model, k):
+    """
+        Initialise un processus de travail de l'évaluation
+
+        :param model: Modèle à interroger
+        :param k: Nombre de documents retournés
+        :type  model: IRmodel
+        :type  k: int
+    """
+
+    worker["model"] = model
+    worker["k"] = k
+
+
+def rankQuery(text):
+    """
+        Exécute une requête dans un processus de travail
+
+        :param text: Texte de la requête
+        :type  text: str
+        :rtype: tuple
+    """
+
+    return timeRanking(worker["model"], text, worker["k"])
@@ -1,13 +1,14 @@
 # coding: utf-8
 
 import time
+import math
+import heapq
+from itertools import accumulate
 import logging
-log = logging.getLogger()
-log.setLevel(logging.DEBUG)
-log_format = logging.Formatter('%(asctime)s :: %(levelname)s :: %(message)s')
-stream_handler = logging.StreamHandler()
-stream_handler.setLevel(logging.DEBUG)
-log.addHandler(stream_handler)
+from Weighter import Weighter
+import Cache
+import Cursor
+log = logging.getLogger(__name__)
 
 
 
@@ -16,32 +17,764 @@ class IRmodel(object):
         IRmodel
     """
 
-    def __init__(self, index):
+    cache = None
+    cacheVersion = None
+
+    def __init__(self, index, weighter=None):
         """
             Initialise un objet IRmodel
 
             :param index: Objet Index
+            :param weighter: Pondération à utiliser (tf par défaut)
             :type  index: Index
+            :type  weighter: Weighter
         """
 
         self.index = index
+        self.weighter = weighter or Weighter(index)
+
+
+    def getTermScores(self, stem, weight):
+        """
+            Retourne la contribution d'un terme de la requête au score des documents
+
+            Les modèles additifs (vectoriel, BM25...) n'ont qu'à définir
+            cette méthode : le moteur de getRanking() se charge de parcourir
+            les listes et de cumuler les contributions.
+
+            :param stem: Terme de la requête
+            :param weight: Poids du terme dans la requête
+            :type  stem: str
+            :type  weight: float
+            :return: Ordinaux croissants des documents et contributions associées
+            :rtype: tuple(sequence, sequence)
+        """
+        raise NotImplementedError
+
+
+    def getUpperBound(self, stem, weight):
+        """
+            Retourne un majorant de la contribution d'un terme de la requête
+
+            Utilisé pour l'élagage de getRanking() ; le majorant doit être
+            calculable sans lire la liste de postings du terme.
+
+            :param stem: Terme de la requête
+            :param weight: Poids du terme dans la requête
+            :type  stem: str
+            :type  weight: float
+            :rtype: float
+        """
+        raise NotImplementedError
+
+
+    def getTermScorer(self, stem, weight):
+        """
+            Retourne les fonctions de score d'un terme de la requête, document par document
+
+            Variante de getTermScores() utilisée avec les curseurs (voir
+            Weighter.getCursorForStem()) : seuls les documents atteints par
+            le curseur sont scorés. La contribution d'un document doit être
+            calculée exactement comme dans getTermScores().
+
+            :param stem: Terme de la requête
+            :param weight: Poids du terme dans la requête
+            :type  stem: str
+            :type  weight: float
+            :return: Contribution d'un document, fonction de son ordinal et
+                     de son poids, et majorant de la contribution des
+                     documents dont le poids ne dépasse pas un poids donné
+                     et dont la longueur n'est pas inférieure à une
+                     longueur donnée (voir Cursor)
+            :rtype: tuple(callable, callable)
+        """
+        raise NotImplementedError
 
 
-    def getScores(query):
+    def getScores(self, query):
         """
             Retourne les scores des documents pour une requête donnée
 
+            Seuls les documents contenant au moins un terme de la requête
+            sont retournés.
+
             :param query: Requête à traiter
             :type  query: str
+            :return: Score de chaque document
+            :rtype: dict
+        """
+        return dict(self.getRanking(query))
+
+
+    def setCache(self, budget, ttl=None):
+        """
+            Alloue (ou supprime) le cache des résultats de getRanking()
+
+            Les résultats sont indexés par la représentation normalisée de
+            la requête (couples terme-tf triés, expressions), k et pruning :
+            des requêtes ne différant que par la casse, les mots vides, la
+            flexion ou l'ordre des mots partagent la même entrée. Le cache
+            est vidé dès que l'index est modifié (voir Index.version).
+
+            :param budget: Mémoire allouée, en octets (None pour supprimer le cache)
+            :param ttl: Durée de vie d'un résultat, en secondes (illimitée par défaut)
+            :type  budget: int
+            :type  ttl: float
+        """
+        self.cache = None if budget is None else Cache.LRUCache(budget, Cache.sizeofRanking, ttl)
+        self.cacheVersion = None
+
+
+    def cacheInfo(self):
+        """
+            Retourne les statistiques du cache des résultats
+
+            .. seealso:: Cache.LRUCache.info()
+
+            :rtype: dict
+        """
+        return None if self.cache is None else self.cache.info()
+
+
+    def getRanking(self, query, k=None, pruning=False, conjunctive=False):
+        """
+            Retourne les documents classés par score décroissant
+
+            Si un cache a été alloué (voir setCache()), le classement d'une
+            requête déjà traitée sur la même version de l'index est retourné
+            sans nouveau calcul.
+
+            Si l'index est positionnel, les expressions de la requête (voir
+            Weighter.getPhrases()) restreignent le classement aux documents
+            qui les contiennent ; sinon, leurs mots sont de simples termes.
+
+            .. seealso:: getRankingForWeights()
+
+            :param query: Requête à traiter
+            :param k: Nombre de documents à retourner (tous par défaut)
+            :param pruning: Autorise l'élagage MaxScore (ou block-max)
+            :param conjunctive: Ne retient que les documents contenant tous les termes
+            :type  query: str
+            :type  k: int
+            :type  pruning: bool
+            :type  conjunctive: bool
+            :return: Couples (document, score)
+            :rtype: list
+        """
+        phrases = self.weighter.getPhrases(query) if self.index.positions else []
+        if self.cache is None:
+            return self.getRankingForWeights(self.weighter.getWeightsForQuery(query), k, pruning, conjunctive,
+                                             phrases)
+
+        version = self.index.version
+        if self.cacheVersion != version:
+            self.cache.clear()
+            self.cacheVersion = version
+        key = (version, tuple(sorted(self.weighter.getQueryRepresentation(query).items())),
+               tuple(sorted(p.key for p in phrases)), k, pruning, conjunctive)
+
+        ranking = self.cache.get(key)
+        if ranking is None:
+            ranking = self.getRankingForWeights(self.weighter.getWeightsForQuery(query), k, pruning, conjunctive,
+                                                phrases)
+            self.cache.put(key, ranking)
+        return list(ranking)
+
+
+    def getRankingForWeights(self, weights, k=None, pruning=False, conjunctive=False, phrases=None):
+        """
+            Retourne les documents classés par score décroissant pour des poids de requête
+
+            Évaluation document par document : les listes de postings des
+            seuls termes de la requête sont parcourues simultanément, dans
+            l'ordre des ordinaux, et chaque document est scoré une seule
+            fois. Si k est donné, seuls les k meilleurs documents sont
+            conservés dans un tas. À score égal, les documents sont classés
+            par ordinal croissant.
+
+            Si k est donné, que pruning est demandé et que le modèle sait
+            majorer la contribution de chaque terme, l'évaluation se fait
+            par MaxScore (voir getRankingMaxScore()), avec un classement
+            identique. L'élagage n'est rentable que sur de longues listes :
+            sur un corpus de la taille de CACM, le surcoût par candidat
+            l'emporte.
+
+            Si conjunctive est demandé, seuls les documents contenant tous
+            les termes sont classés (voir getRankingConjunctive()) ; si des
+            expressions sont données, seuls ceux qui les contiennent toutes
+            (voir getRankingPhrases()).
+
+            :param weights: Poids des termes de la requête
+            :param k: Nombre de documents à retourner (tous par défaut, aucun
+                      s'il est nul ou négatif)
+            :param pruning: Autorise l'élagage MaxScore (ou block-max)
+            :param conjunctive: Ne retient que les documents contenant tous les termes
+            :param phrases: Expressions de la requête, pour un index positionnel
+            :type  weights: dict
+            :type  k: int
+            :type  pruning: bool
+            :type  conjunctive: bool
+            :type  phrases: list
+            :return: Couples (document, score)
+            :rtype: list
+        """
+        if k is not None and k <= 0:
+            return []
+
+        terms = list(weights.items())
+
+        if phrases:
+            return self.getRankingPhrases(terms, phrases, k, conjunctive)
+
+        if conjunctive:
+            return self.getRankingConjunctive(terms, k, pruning)
+
+        if k is not None and pruning:
+            try:
+                return self.getRankingMaxScore(terms, k)
+            except NotImplementedError:
+                pass
+
+        lists = [self.getTermScores(stem, weight) for stem, weight in terms]
+        lists = [(ords, scores) for ords, scores in lists if len(ords)]
+
+        # Tas des curseurs (document courant, liste, position)
+        cursors = [(ords[0], i, 0) for i, (ords, scores) in enumerate(lists)]
+        heapq.heapify(cursors)
+
+        # Tas des meilleurs documents (score, -ordinal)
+        top = []
+
+        while cursors:
+            doc = cursors[0][0]
+            score = 0
+            while cursors and cursors[0][0] == doc:
+                _, i, p = cursors[0]
+                ords, scores = lists[i]
+                score += scores[p]
+                if p + 1 < len(ords):
+                    heapq.heapreplace(cursors, (ords[p + 1], i, p + 1))
+                else:
+                    heapq.heappop(cursors)
+
+            if k is None or len(top) < k:
+                heapq.heappush(top, (score, -doc))
+            elif (score, -doc) > top[0]:
+                heapq.heapreplace(top, (score, -doc))
+
+        return [(self.index.docIds[-d], score) for score, d in sorted(top, reverse=True)]
+
+
+    def getRankingMaxScore(self, terms, k):
+        """
+            Retourne les k meilleurs documents par l'algorithme MaxScore
+
+            Les listes sont triées par majorant croissant. Tant que la somme
+            des majorants des premières listes ne dépasse pas le score du
+            k-ième document, ces listes sont « non essentielles » : aucun
+            document qui n'apparaît que dans celles-ci ne peut entrer dans le
+            classement. Seules les listes essentielles sont parcourues pour
+            proposer des candidats ; les autres ne sont consultées, par
+            curseur (voir Cursor.advance()), que tant que le candidat peut
+            encore entrer.
+
+            Les listes sont lues par curseurs : avant de consulter les
+            listes non essentielles, leurs majorants sont remplacés par ceux
+            des seuls blocs qui peuvent contenir le candidat (block-max), un
+            bloc qui ne le contient pas ne comptant pas. Les blocs écartés ne
+            sont jamais décodés.
+
+            Le score final d'un document est cumulé dans l'ordre des termes
+            de la requête, comme dans getRankingForWeights(), afin de retourner
+            exactement le même classement.
+
+            :param terms: Couples (terme, poids) de la requête
+            :param k: Nombre de documents à retourner
+            :type  terms: list
+            :type  k: int
+            :return: Couples (document, score)
+            :rtype: list
+        """
+        bounds = [self.getUpperBound(stem, weight) for stem, weight in terms]
+
+        lists = []
+        for i, (stem, weight) in enumerate(terms):
+            cursor = self.weighter.getCursorForStem(stem)
+            if cursor.doc != Cursor.END:
+                score, bound = self.getTermScorer(stem, weight)
+                lists.append((bounds[i], i, cursor, score, bound))
+        lists.sort(key=lambda l: l[0])
+
+        n = len(lists)
+        cumul = list(accumulate(l[0] for l in lists))
+        top = []
+        essential = 0
+        blockEnds = [-1] * n
+        blockBounds = [0] * n
+
+        # Un majorant est comparé au seuil avec une marge couvrant les
+        # erreurs d'arrondi dues à l'ordre des additions
+        def below(bound):
+            return bound + 1e-9 * abs(bound) <= top[0][0]
+
+        # Tas des curseurs (document courant, liste) ; les curseurs des
+        # listes devenues non essentielles sont ignorés à leur sortie du tas
+        cursors = [(l[2].doc, j) for j, l in enumerate(lists)]
+        heapq.heapify(cursors)
+
+        while cursors:
+            doc = cursors[0][0]
+
+            parts = {}
+            partial = 0
+            while cursors and cursors[0][0] == doc:
+                j = cursors[0][1]
+                if j < essential:
+                    heapq.heappop(cursors)
+                    continue
+                _, i, cursor, score, _ = lists[j]
+                parts[i] = score(doc, cursor.tf)
+                partial += parts[i]
+                if cursor.next() != Cursor.END:
+                    heapq.heapreplace(cursors, (cursor.doc, j))
+                else:
+                    heapq.heappop(cursors)
+            if not parts:
+                continue
+
+            if essential and below(partial + cumul[essential - 1]):
+                continue
+
+            # Majorants cumulés des blocs des listes non essentielles
+            # susceptibles de contenir le candidat ; le majorant d'une liste
+            # reste valable jusqu'à l'ordinal blockEnds[j]
+            blocks = []
+            b = 0
+            for j in range(essential):
+                if doc > blockEnds[j]:
+                    cursor, bound = lists[j][2], lists[j][4]
+                    p = cursor.shallow(doc)
+                    if p == len(cursor.lasts):
+                        blockEnds[j], blockBounds[j] = Cursor.END, 0
+                    elif cursor.firsts[p] > doc:
+                        blockEnds[j], blockBounds[j] = cursor.firsts[p] - 1, 0
+                    else:
+                        blockEnds[j] = cursor.lasts[p]
+                        blockBounds[j] = min(bound(cursor.maxTfs[p], cursor.minLengths[p]), lists[j][0])
+                b += blockBounds[j]
+                blocks.append(b)
+
+            # Listes non essentielles, de la plus forte à la plus faible
+            pruned = False
+            for j in range(essential - 1, -1, -1):
+                if below(partial + blocks[j]):
+                    pruned = True
+                    break
+                _, i, cursor, score, _ = lists[j]
+                if cursor.advance(doc) == doc:
+                    parts[i] = score(doc, cursor.tf)
+                    partial += parts[i]
+            if pruned:
+                continue
+
+            score = 0
+            for i in sorted(parts):
+                score += parts[i]
+
+            if len(top) < k:
+                heapq.heappush(top, (score, -doc))
+            elif (score, -doc) > top[0]:
+                heapq.heapreplace(top, (score, -doc))
+
+            if len(top) == k:
+                while essential < n and below(cumul[essential]):
+                    essential += 1
+
+        return [(self.index.docIds[-d], score) for score, d in sorted(top, reverse=True)]
+
+
+    def getRankingConjunctive(self, terms, k=None, pruning=False):
+        """
+            Retourne les documents contenant tous les termes de la requête, classés par score décroissant
+
+            Les listes sont lues par curseurs, de la plus courte à la plus
+            longue : la plus courte propose les candidats, que les autres
+            rejoignent par Cursor.advance() en sautant, sans les décoder,
+            les blocs qui ne peuvent les contenir. Le coût de l'intersection
+            dépend ainsi de la liste la plus courte.
+
+            Si k est donné et que pruning est demandé, l'évaluation est de
+            type block-max : avant de chercher un candidat dans les autres
+            listes, la somme des majorants des blocs qui peuvent le contenir
+            est comparée au score du k-ième document ; si elle ne le dépasse
+            pas, tous les documents jusqu'à la fin du plus court de ces blocs
+            sont écartés d'un coup.
+
+            Le score d'un document est cumulé dans l'ordre des termes de la
+            requête, comme dans getRankingForWeights() : le classement est
+            celui de getRankingForWeights() restreint aux documents contenant
+            tous les termes.
+
+            :param terms: Couples (terme, poids) de la requête
+            :param k: Nombre de documents à retourner (tous par défaut)
+            :param pruning: Autorise l'élagage block-max
+            :type  terms: list
+            :type  k: int
+            :type  pruning: bool
+            :return: Couples (document, score)
+            :rtype: list
+        """
+        lists = []
+        for i, (stem, weight) in enumerate(terms):
+            score, bound = self.getTermScorer(stem, weight)
+            lists.append((self.index.getDf(stem), i, self.weighter.getCursorForStem(stem), score, bound))
+        if not lists:
+            return []
+        ordered = [l[2:4] for l in lists]
+        lists.sort(key=lambda l: l[0])
+        lead = lists[0][2]
+        pruning = pruning and k is not None
+        top = []
+
+        def below(bound):
+            return bound + 1e-9 * abs(bound) <= top[0][0]
+
+        # Majorant des documents jusqu'à l'ordinal last, fin du plus court
+        # des blocs susceptibles de les contenir ; il n'est recalculé qu'une
+        # fois last dépassé, mais comparé au seuil à chaque candidat
+        bound, last = 0, -1
+
+        doc = lead.doc
+        while doc != Cursor.END:
+            if pruning and len(top) == k:
+                if doc > last:
+                    blocks = [(cursor.shallow(doc), cursor, blockBound) for _, _, cursor, _, blockBound in lists]
+                    if any(p == len(cursor.lasts) for p, cursor, _ in blocks):
+                        break
+                    bound = sum(blockBound(cursor.maxTfs[p], cursor.minLengths[p]) for p, cursor, blockBound in blocks)
+                    last = min(cursor.lasts[p] for p, cursor, _ in blocks)
+                if below(bound):
+                    doc = lead.advance(last + 1)
+                    continue
+
+            match = doc
+            for _, _, cursor, _, _ in lists[1:]:
+                match = cursor.advance(doc)
+                if match != doc:
+                    break
+            if match != doc:
+                doc = lead.advance(match)
+                continue
+
+            score = 0
+            for cursor, termScore in ordered:
+                score += termScore(doc, cursor.tf)
+
+            if k is None or len(top) < k:
+                heapq.heappush(top, (score, -doc))
+            elif (score, -doc) > top[0]:
+                heapq.heapreplace(top, (score, -doc))
+            doc = lead.next()
+
+        return [(self.index.docIds[-d], score) for score, d in sorted(top, reverse=True)]
+
+
+    def getRankingPhrases(self, terms, phrases, k=None, conjunctive=False):
         """
-        return NotImplementedError
+            Retourne les documents contenant toutes les expressions de la requête, classés par score décroissant
+
+            Les candidats sont d'abord les documents contenant tous les
+            stems des expressions (et tous les termes si conjunctive est
+            demandé) : les listes sont intersectées par curseurs, depuis la
+            plus courte, comme dans getRankingConjunctive(). Les positions
+            (voir Index.getPositions()) ne sont lues que pour ces candidats,
+            et seulement celles des stems des expressions.
+
+            Le score d'un document retenu est cumulé dans l'ordre des termes
+            de la requête : le classement est celui de getRankingForWeights()
+            restreint aux documents contenant les expressions.
+
+            :param terms: Couples (terme, poids) de la requête
+            :param phrases: Expressions de la requête (voir Phrase)
+            :param k: Nombre de documents à retourner (tous par défaut)
+            :param conjunctive: Ne retient que les documents contenant tous les termes
+            :type  terms: list
+            :type  phrases: list
+            :type  k: int
+            :type  conjunctive: bool
+            :return: Couples (document, score)
+            :rtype: list
+        """
+        stems = set().union(*(p.stems for p in phrases))
+        required = stems | {stem for stem, weight in terms} if conjunctive else stems
+        cursors = {stem: self.weighter.getCursorForStem(stem) for stem in required}
+        for stem, weight in terms:
+            if stem not in cursors:
+                cursors[stem] = self.weighter.getCursorForStem(stem)
+        ordered = [(cursors[stem], self.getTermScorer(stem, weight)[0]) for stem, weight in terms]
+
+        lists = [cursors[stem] for stem in sorted(required, key=self.index.getDf)]
+        lead = lists[0]
+        top = []
 
+        doc = lead.doc
+        while doc != Cursor.END:
+            match = doc
+            for cursor in lists[1:]:
+                match = cursor.advance(doc)
+                if match != doc:
+                    break
+            if match != doc:
+                doc = lead.advance(match)
+                continue
 
-    def getRanking(query):
+            positions = self.index.getPositions(doc, stems)
+            if all(p.match(positions) for p in phrases):
+                score = 0
+                for cursor, termScore in ordered:
+                    if cursor.advance(doc) == doc:
+                        score += termScore(doc, cursor.tf)
+
+                if k is None or len(top) < k:
+                    heapq.heappush(top, (score, -doc))
+                elif (score, -doc) > top[0]:
+                    heapq.heapreplace(top, (score, -doc))
+            doc = lead.next()
+
+        return [(self.index.docIds[-d], score) for score, d in sorted(top, reverse=True)]
+
+
+
+class Vectoriel(IRmodel):
+    """
+        Modèle vectoriel
+
+        Score d'un document : produit scalaire entre les poids des termes
+        de la requête et ceux du document, éventuellement divisé par la
+        norme du document (précalculée à l'indexation).
+    """
+
+    def __init__(self, index, weighter=None, normalized=False):
+        """
+            Initialise un objet Vectoriel
+
+            :param index: Objet Index
+            :param weighter: Pondération à utiliser (tf par défaut)
+            :param normalized: Divise le score par la norme des tfs du document
+            :type  index: Index
+            :type  weighter: Weighter
+            :type  normalized: bool
         """
-            Retourne le scores de chacun des documents
+
+        IRmodel.__init__(self, index, weighter)
+        self.normalized = normalized
+
+    def getTermScores(self, stem, weight):
+        ords, weights = self.weighter.getPostingsForStem(stem)
+        if self.normalized:
+            norms = self.index.docNorms
+            return ords, [weight * w / norms[o] for o, w in zip(ords, weights)]
+        return ords, [weight * w for w in weights]
+
+    def getTermScorer(self, stem, weight):
+        if self.normalized:
+            norms = self.index.docNorms
+            # Un tf ne dépasse jamais la norme du document
+            return (lambda o, w: weight * w / norms[o]), (lambda w, length: max(0, weight))
+        return (lambda o, w: weight * w), (lambda w, length: max(0, weight * w))
+
+    def getUpperBound(self, stem, weight):
+        if not self.index.getDf(stem):
+            return 0
+        if self.normalized:
+            # Un tf ne dépasse jamais la norme du document
+            return max(0, weight)
+        return max(0, weight * self.weighter.getMaxWeightForStem(stem))
+
+
+
+class Okapi(IRmodel):
+    """
+        Modèle probabiliste Okapi BM25
+
+        Score d'un document : somme sur les termes de la requête de
+        idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * longueur / longueur moyenne)),
+        pondérée par le poids du terme dans la requête.
+    """
+
+    def __init__(self, index, weighter=None, k1=1.2, b=0.75):
+        """
+            Initialise un objet Okapi
+
+            :param index: Objet Index
+            :param weighter: Pondération à utiliser (tf par défaut)
+            :param k1: Saturation du tf
+            :param b: Normalisation par la longueur des documents
+            :type  index: Index
+            :type  weighter: Weighter
+            :type  k1: float
+            :type  b: float
+        """
+
+        IRmodel.__init__(self, index, weighter)
+        self.k1 = k1
+        self.b = b
+
+    def getIdf(self, stem):
+        """
+            Retourne l'idf d'un terme (toujours positif)
 
             :param stem: Terme à traiter
             :type  stem: str
+            :rtype: float
+        """
+        n = self.index.getNbDocs()
+        df = self.index.getDf(stem)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def getTermScores(self, stem, weight):
+        ords, tfs = self.weighter.getPostingsForStem(stem)
+        if not len(ords):
+            return ords, []
+        lengths = self.index.docLengths
+        avg = self.index.getAvgDocLength()
+        c = weight * self.getIdf(stem) * (self.k1 + 1)
+        k = self.k1 * (1 - self.b)
+        kl = self.k1 * self.b / avg
+        return ords, [c * tf / (tf + k + kl * lengths[o]) for o, tf in zip(ords, tfs)]
+
+    def getTermScorer(self, stem, weight):
+        lengths = self.index.docLengths
+        avg = self.index.getAvgDocLength()
+        c = weight * self.getIdf(stem) * (self.k1 + 1)
+        k = self.k1 * (1 - self.b)
+        kl = self.k1 * self.b / avg
+        # Le score croît avec le tf et décroît avec la longueur du document
+        return ((lambda o, tf: c * tf / (tf + k + kl * lengths[o])),
+                (lambda tf, length: max(0, c * tf / (tf + k + kl * length))))
+
+    def getUpperBound(self, stem, weight):
+        if not self.index.getDf(stem):
+            return 0
+        tf = self.weighter.getMaxWeightForStem(stem)
+        return max(0, weight * self.getIdf(stem) * (self.k1 + 1) * tf / (tf + self.k1 * (1 - self.b)))
+
+
+
+class BM25F(Okapi):
+    """
+        Modèle probabiliste BM25F
+
+        Variante d'Okapi BM25 pour un index à champs (voir Index.fields) :
+        le tf d'un terme dans chaque champ est normalisé par la longueur du
+        champ et pondéré par le poids du champ ; la somme de ces tfs est
+        saturée une seule fois, par tf / (tf + k1). Le reste du document,
+        son texte hors des champs, compte comme un champ de poids 1.
+
+        Un terme restreint à un champ ("author.pooch", voir
+        Weighter.getQueryRepresentation()) n'est compté que dans ce champ.
+    """
+
+    def __init__(self, index, weighter=None, k1=1.2, b=0.75, fieldWeights=None, fieldBs=None):
         """
-        return sorted(self.getScores(query).items(), key=lambda t: t[1], reverse=True)
+            Initialise un objet BM25F
+
+            :param index: Objet Index
+            :param weighter: Pondération à utiliser (tf par défaut)
+            :param k1: Saturation du tf
+            :param b: Normalisation par la longueur du reste du document
+            :param fieldWeights: Poids de chaque champ (1 par défaut)
+            :param fieldBs: Normalisation par la longueur de chaque champ (b par défaut)
+            :type  index: Index
+            :type  weighter: Weighter
+            :type  k1: float
+            :type  b: float
+            :type  fieldWeights: dict
+            :type  fieldBs: dict
+        """
+
+        Okapi.__init__(self, index, weighter, k1, b)
+        self.fieldWeights = fieldWeights or {}
+        self.fieldBs = fieldBs or {}
+
+    def getFieldNorm(self, i):
+        """
+            Retourne les paramètres de normalisation d'un champ
+
+            Le tf normalisé d'un document est w * tf / (k + kl * longueur).
+
+            :param i: Rang du champ dans Index.fields
+            :type  i: int
+            :return: Poids w, constantes k et kl, longueurs du champ par ordinal
+            :rtype: tuple
+        """
+        field = self.index.fields[i]
+        b = self.fieldBs.get(field, self.b)
+        avg = self.index.fieldTotals[i] / max(1, self.index.getNbDocs())
+        return self.fieldWeights.get(field, 1), 1 - b, b / avg if avg else 0, self.index.fieldLengths[i]
+
+    def getTermFunction(self, stem, weight):
+        """
+            Retourne la contribution d'un terme de la requête au score d'un document
+
+            Les listes de postings du terme dans les champs, courtes, sont
+            lues en entier ; le tf du reste du document est son tf dans le
+            texte complet diminué de ses tfs dans les champs.
+
+            :param stem: Terme de la requête
+            :param weight: Poids du terme dans la requête
+            :type  stem: str
+            :type  weight: float
+            :return: Contribution d'un document, fonction de son ordinal et de son tf
+            :rtype: callable
+        """
+        c = weight * self.getIdf(stem) * (self.k1 + 1)
+        k1 = self.k1
+        field, dot, _ = stem.partition(".")
+        if dot:
+            w, k, kl, lengths = self.getFieldNorm(self.index.fields.index(field))
+            def score(o, tf):
+                x = w * tf / (k + kl * lengths[o])
+                return c * x / (x + k1)
+            return score
+
+        fields = []
+        for i, field in enumerate(self.index.fields):
+            ords, tfs = self.weighter.getPostingsForStem(field + "." + stem)
+            if len(ords):
+                fields.append((dict(zip(ords, tfs)),) + self.getFieldNorm(i))
+        docLengths = self.index.docLengths
+        fieldLengths = self.index.fieldLengths
+        avg = (self.index.length - sum(self.index.fieldTotals)) / max(1, self.index.getNbDocs())
+        k = 1 - self.b
+        kl = self.b / avg if avg else 0
+
+        def score(o, tf):
+            x = 0
+            for tfs, w, fk, fkl, lengths in fields:
+                t = tfs.get(o)
+                if t:
+                    tf -= t
+                    x += w * t / (fk + fkl * lengths[o])
+            rest = docLengths[o] - sum(l[o] for l in fieldLengths)
+            if tf > 0 and rest:
+                x += tf / (k + kl * rest)
+            return c * x / (x + k1)
+        return score
+
+    def getTermScores(self, stem, weight):
+        ords, tfs = self.weighter.getPostingsForStem(stem)
+        if not len(ords):
+            return ords, []
+        score = self.getTermFunction(stem, weight)
+        return ords, [score(o, tf) for o, tf in zip(ords, tfs)]
+
+    def getTermScorer(self, stem, weight):
+        bound = max(0, weight * self.getIdf(stem) * (self.k1 + 1))
+        # La saturation x / (x + k1) reste inférieure à 1
+        return self.getTermFunction(stem, weight), (lambda tf, length: bound)
+
+    def getUpperBound(self, stem, weight):
+        if not self.index.getDf(stem):
+            return 0
+        return max(0, weight * self.getIdf(stem) * (self.k1 + 1))
@@ -0,0 +1,88 @@
+# coding: utf-8
+
+from array import array
+from bisect import bisect_left, insort_right
+
+
+class IdList(list):
+    """
+        IdList
+
+        Liste d'identifiants (documents ou stems) rangés par ordinal, doublée
+        d'une permutation qui les trie : l'ordinal d'un identifiant est
+        retrouvé par recherche dichotomique. La table de correspondance ne
+        coûte ainsi que 4 octets par identifiant, au lieu d'une entrée de
+        dictionnaire.
+
+        Les identifiants ne doivent être ajoutés que par append() ou
+        extend(), qui maintiennent la permutation.
+    """
+
+    def __init__(self, ids=(), order=None):
+        """
+            Initialise un objet IdList
+
+            :param ids: Identifiants, dans l'ordre de leurs ordinaux
+            :param order: Ordinaux triés par identifiant, s'ils sont déjà connus
+            :type ids: iterable
+            :type order: iterable
+        """
+
+        list.__init__(self, ids)
+        if order is None:
+            order = sorted(range(len(self)), key=self.__getitem__)
+        self.order = array("I", order)
+
+    def __reduce__(self):
+        # La permutation doit exister avant l'ajout des identifiants
+        return self.__class__, (list(self), self.order)
+
+    def find(self, key):
+        """
+            Retourne l'ordinal d'un identifiant (-1 s'il est absent)
+
+            Si l'identifiant apparaît plusieurs fois, le plus petit ordinal
+            est retourné.
+
+            :param key: Identifiant recherché
+            :type key: str
+            :rtype: int
+        """
+
+        p = bisect_left(self.order, key, key=self.__getitem__)
+        if p < len(self.order) and self[self.order[p]] == key:
+            return self.order[p]
+        return -1
+
+    def append(self, key):
+        list.append(self, key)
+        insort_right(self.order, len(self) - 1, key=self.__getitem__)
+
+    def extend(self, ids):
+        for key in ids:
+            self.append(key)
+
+    def prefix(self, prefix):
+        """
+            Génère les couples (identifiant, ordinal) des identifiants commençant par un préfixe
+
+            :param prefix: Préfixe recherché
+            :type prefix: str
+            :rtype: generator
+        """
+
+        for p in range(bisect_left(self.order, prefix, key=self.__getitem__), len(self.order)):
+            key = self[self.order[p]]
+            if not key.startswith(prefix):
+                return
+            yield key, self.order[p]
+
+    def sorted(self):
+        """
+            Génère les couples (identifiant, ordinal) dans l'ordre des identifiants
+
+            :rtype: generator
+        """
+
+        for n in self.order:
+            yield self[n], n
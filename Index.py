@@ -1,6 +1,25 @@
 # coding: utf-8
 
+import os
+import sys
+import math
+import mmap
+import json
 import time
+import heapq
+import struct
+import functools
+import shutil
+import contextlib
+import multiprocessing
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+import codec
+import Cache
+import Cursor
+import Lexicon
+from IdList import IdList
 import logging
 log = logging.getLogger()
 log.setLevel(logging.DEBUG)
@@ -11,15 +30,42 @@ stream_handler.setLevel(logging.DEBUG)
 log.addHandler(stream_handler)
 log.info("\033[?25l")
 
+_skipsFooter = struct.Struct("<III")
+_positionsFooter = struct.Struct("<Q")
+
+# Coût en mémoire d'un stem dans les postings accumulés : deux tableaux,
+# le couple qui les réunit et l'entrée du dictionnaire
+_bufferStemSize = 2 * sys.getsizeof(array("I")) + sys.getsizeof((0, 0)) + 32
+
 
 class Index(object):
     """
         Index
 
         Objet construisant et conservant les index et index inversé d'un corpus textuel.
+
+        Documents et stems sont désignés par des ordinaux denses, leur rang
+        dans Index.docIds et Index.stemIds ; leurs propriétés (position dans
+        les fichiers, source, statistiques) sont rangées dans des tableaux
+        indexés par ordinal.
     """
 
-    def __init__(self, name, parser, textRepresenter, source, keep_alive=False):
+    encoding = "text"
+    maps = {}
+    cache = None
+    lexicon = None
+    # Incrémenté à chaque modification : les résultats calculés sur une
+    # version antérieure de l'index ne sont plus valides
+    version = 0
+    # Nombre de postings par bloc des tables de sauts (voir writeSkips())
+    blockSize = 128
+    # Indique si les positions des stems dans les documents sont indexées
+    positions = False
+    # Champs des documents indexés séparément (voir analyseDocument())
+    fields = ()
+
+    def __init__(self, name, parser, textRepresenter, source, keep_alive=False, memory=None, encoding="text", workers=1,
+                 cache=None, positions=False, fields=()):
         """
             Initialise un objet Index
 
@@ -28,21 +74,59 @@ class Index(object):
             :param textRepresenter: Représentation du corpus
             :param source: Corpus à indexer
             :param keep_alive: Indique s'il faut conserver l'index en mémoire vive
+            :param memory: Mémoire allouée aux postings lors de l'indexation, en octets
+            :param encoding: Format des fichiers d'index, "text" ou "binary"
+            :param workers: Nombre de processus indexant les documents
+            :param cache: Mémoire allouée au cache des listes de postings, en octets
+            :param positions: Indique s'il faut indexer les positions des stems (voir getPositions())
+            :param fields: Champs des documents (Document.others) dont les
+                           stems sont aussi indexés séparément
             :type name: str
             :type parser: Parser
             :type textRep: TextRepresenter
             :type source: str
             :type keep_alive: bool
+            :type memory: int
+            :type encoding: str
+            :type workers: int
+            :type cache: int
+            :type positions: bool
+            :type fields: tuple
         """
 
         self.name = name
-        self.docs = {}
-        self.stems = {}
-        self.docFrom = {}
+        self.docIds = []
+        self.docOffsets = array("Q")
+        self.docSizes = array("I")
+        self.docSources = array("I")
+        self.docStarts = array("Q")
+        self.docBytes = array("I")
+        self.docLengths = array("I")
+        self.docNorms = array("d")
+        self.sources = []
+        self.stemIds = []
+        self.stemOffsets = array("Q")
+        self.stemSizes = array("I")
+        self.stemDfs = array("I")
+        self.stemMaxTfs = array("I")
+        self.stemCfs = array("I")
+        self.length = 0
         self.parser = parser
         self.textRep = textRepresenter
         self.source = source
         self.keep_alive = keep_alive
+        self.memory = memory
+        self.encoding = encoding
+        self.workers = workers
+        self.positions = positions
+        self.fields = list(fields)
+        self.fieldLengths = [array("I") for f in self.fields]
+        self.fieldTotals = [0] * len(self.fields)
+        self.delta = {}
+        self.deltaDocs = {}
+        self.deleted = bytearray()
+        self.nbDeleted = 0
+        self.setCache(cache)
 
         if self.keep_alive:
             self.index = {}
@@ -80,86 +164,578 @@ class Index(object):
             .. seealso:: writeDict()
 
             :param b: Cha→ne à convertir
-            :type b: str
+            :type b: bytes-like
             :return: Dictionnaire lu
             :rtype: dict
         """
 
-        return {w: int(n) for w, n in [s.split(':') for s in b.decode().split(';')]}
+        return {w: int(n) for w, n in [s.split(':') for s in str(b, "utf-8").split(';')]}
+
+    def writeDoc(self, st, ordinals, encoding=None):
+        """
+            Encode la représentation stem-tf d'un document
+
+            :param st: Représentation stem-tf
+            :param ordinals: Ordinal de chaque stem
+            :param encoding: Format à utiliser, celui de l'index par défaut
+            :type st: dict
+            :type ordinals: dict
+            :type encoding: str
+            :rtype: bytes
+        """
+
+        if (encoding or self.encoding) == "text":
+            return self.writeDict(st) + b"\n"
+        items = sorted((ordinals[s], n) for s, n in st.items())
+        return codec.encode([o for o, n in items], [n for o, n in items])
+
+    def readDoc(self, b):
+        """
+            Décode la représentation stem-tf d'un document
+
+            .. seealso:: writeDoc()
+
+            :param b: Enregistrement lu dans l'index
+            :type b: bytes
+            :rtype: dict
+        """
+
+        if self.encoding == "text":
+            return self.readDict(b)
+        ords, tfs = codec.decode(b)
+        return {self.stemIds[o]: n for o, n in zip(ords, tfs)}
+
+    def writePositions(self, positions, ordinals, encoding=None):
+        """
+            Encode les positions des stems d'un document
+
+            Les stems sont rangés dans l'ordre de leur représentation stem-tf
+            écrite par writeDoc() : leur tf donne le nombre de leurs
+            positions. Au format binaire, les positions sont compressées par
+            écarts (voir codec.encodePositions()).
+
+            :param positions: Positions croissantes de chaque stem
+            :param ordinals: Ordinal de chaque stem
+            :param encoding: Format à utiliser, celui de l'index par défaut
+            :type positions: dict
+            :type ordinals: dict
+            :type encoding: str
+            :rtype: bytes
+        """
+
+        if (encoding or self.encoding) == "text":
+            return ';'.join([','.join(map(str, p)) for p in positions.values()]).encode() + b"\n"
+        return codec.encodePositions([positions[s] for s in sorted(positions, key=ordinals.__getitem__)])
+
+    def readPositions(self, b, st, stems=None):
+        """
+            Décode les positions des stems d'un document
+
+            .. seealso:: writePositions()
+
+            :param b: Enregistrement lu dans <name>_positions
+            :param st: Représentation stem-tf du document, lue par readDoc()
+            :param stems: Stems dont les positions sont demandées (tous par défaut)
+            :type b: bytes-like
+            :type st: dict
+            :type stems: set
+            :return: Positions croissantes de chaque stem
+            :rtype: dict
+        """
+
+        keys = list(st)
+        if not keys:
+            return {}
+        wanted = None if stems is None else {k for k, s in enumerate(keys) if s in stems}
+        if self.encoding == "binary":
+            return {keys[k]: p for k, p in codec.decodePositions(b, list(st.values()), wanted)}
+        return {keys[k]: list(map(int, p.split(','))) for k, p in enumerate(str(b, "utf-8").split(';'))
+                if wanted is None or k in wanted}
 
+    def writePostings(self, ords, tfs, encoding=None):
+        """
+            Encode une liste de postings
 
-    def indexation(self):
+            :param ords: Ordinaux croissants des documents
+            :param tfs: Tfs associés
+            :param encoding: Format à utiliser, celui de l'index par défaut
+            :type ords: sequence
+            :type tfs: sequence
+            :type encoding: str
+            :rtype: bytes
+        """
+
+        if (encoding or self.encoding) == "text":
+            return ';'.join([self.docIds[o] + ":" + str(n) for o, n in zip(ords, tfs)]).encode()
+        return codec.encode(ords, tfs)
+
+    def readPostings(self, b):
+        """
+            Décode une liste de postings
+
+            .. seealso:: writePostings()
+
+            :param b: Enregistrement lu dans l'index inversé
+            :type b: bytes
+            :return: Ordinaux des documents et tfs associés
+            :rtype: tuple(array, array)
+        """
+
+        if self.encoding == "binary":
+            return codec.decode(b)
+        dic = self.readDict(b)
+        return array("I", map(self.docIds.find, dic)), array("I", dic.values())
+
+    def joinPostings(self, chunks, bases=None):
+        """
+            Concatène des listes de postings encodées
+
+            :param chunks: Listes encodées, dans l'ordre des documents
+            :param bases: Ordinal ajouté à ceux de chaque liste (0 par défaut)
+            :type chunks: list
+            :type bases: list
+            :rtype: bytes
+        """
+
+        if self.encoding == "text":
+            return b';'.join(chunks)
+        ords, tfs = array("I"), array("I")
+        for c, base in zip(chunks, bases or [0] * len(chunks)):
+            o, t = codec.decode(c)
+            ords.extend([x + base for x in o] if base else o)
+            tfs.extend(t.tolist())
+        return codec.encode(ords, tfs)
+
+
+    def indexation(self, documents=None, count=None):
         """
             Effectue l'indexation du corpus
+
+            .. seealso:: indexDirect(), indexParallel()
+
+            :param documents: Triplets (id, source, stem-tf) à indexer, à la
+                              place du corpus ; pour un index positionnel, la
+                              représentation est remplacée par les positions
+                              de chaque stem
+            :param count: Nombre de documents à indexer, pour la progression
+            :type documents: iterable
+            :type count: int
         """
 
         log.info("Création de l'index " + self.name + "\n\n")
         log_start = time.time()
 
-        self.indexDirect()
-        self.prepareInversed()
-        self.indexInversed()
+        if documents is None and self.workers > 1:
+            self.mergeInversed(*self.indexParallel())
+        elif self.memory is None:
+            self.indexDirect(documents, count)
+            self.prepareInversed()
+            self.indexInversed()
+        else:
+            runs = self.indexDirect(documents, count)
+            self.mergeInversed(runs)
+
+        del self.shapes, self.ordinals
+        self.save()
 
         log.info("\nIndex créé en " + str(time.time() - log_start) + " secondes.\n")
-        log.info(str(len(self.docFrom)) + " documents et " + str(len(self.stems)) + " mots ont été indexés.\n")
+        log.info(str(len(self.docIds)) + " documents et " + str(len(self.stemIds)) + " mots ont été indexés.\n")
 
 
-    def indexDirect(self):
+    def indexDirect(self, documents=None, count=None):
         """
             Effectue l'indexation normale du corpus
+
+            Si un budget mémoire a été fixé, les postings sont accumulés
+            pendant la lecture du corpus puis vidés sur disque, triés par
+            stem, dans des fichiers temporaires dès que le budget est dépassé.
+
+            Des documents déjà analysés peuvent être indexés à la place du
+            corpus (voir merge()).
+
+            Pour un index positionnel, les positions des stems de chaque
+            document sont écrites dans <name>_positions, dans l'ordre de sa
+            représentation stem-tf ; la table de leurs positions dans le
+            fichier et un pied de page (position de cette table) suivent.
+
+            :param documents: Triplets (id, source, stem-tf) à indexer, ou
+                              (id, source, positions) pour un index positionnel
+            :param count: Nombre de documents à indexer, pour la progression
+            :type documents: iterable
+            :type count: int
+            :return: Chemins des fichiers temporaires écrits
+            :rtype: list
         """
 
-        with open("./" + self.name + "_index", "wb") as ifile:
+        runs = []
+        postings = {}
+        size = 0
+        ordinals = self.ordinals = {}
+        self.shapes = {}
+
+        self.posOffsets = array("Q")
+        pfile = open("./" + self.name + "_positions", "wb") if self.positions else contextlib.nullcontext()
+
+        with open("./" + self.name + "_index", "wb") as ifile, pfile:
             ifcur = 0
 
             # Pour chaque document
-            self.parser.initFile(self.source)
-            d = self.parser.nextDocument()
+            if documents is not None:
+                log_size = max(1, count or 0)
+            else:
+                self.parser.initFile(self.source)
+                log_size = self.parser.countDocument()
+                documents = analyse(self.parser, self.textRep, self.positions, self.fields)
 
-            log_size = self.parser.countDocument()
             log_accu = 0
 
             log.debug("Document : ")
 
-            while (d):
+            for id, source, st in documents:
+
+                if self.positions:
+                    positions = st
+                    st = {s: len(p) for s, p in positions.items()}
 
                 # Lecture document
-                id = d.getId()
-                st = self.textRep.getTextRepresentation(d.getText())
+                ordinal = len(self.docIds)
+                self.docIds.append(id)
+                self.appendLengths(st)
+
+                for s in st:
+                    if s not in ordinals:
+                        ordinals[s] = len(self.stemIds)
+                        self.stemIds.append(s)
+                        self.stemSizes.append(0)
+                        self.stemDfs.append(0)
+                        self.stemMaxTfs.append(0)
+                        self.stemCfs.append(0)
 
                 log_accu += 1
                 log_perc = log_accu/log_size
                 log.info("\rIndexation normale [" + "█"*int(50*log_perc) + " "*(50-int(50*log_perc)) + "] " + str(int(100*log_perc)) + "%")
 
                 # Écriture index
-                ifile.write(self.writeDict(st))
+                ifile.write(self.writeDoc(st, ordinals))
+                if self.positions:
+                    self.posOffsets.append(pfile.tell())
+                    pfile.write(self.writePositions(positions, ordinals))
 
                 if self.keep_alive:
                     self.index[id] = st
 
-                ifile.write("\n".encode())
-
                 nfcur = ifile.tell()
 
-                self.docs[id] = (ifcur, nfcur - ifcur)
+                self.docOffsets.append(ifcur)
+                self.docSizes.append(nfcur - ifcur)
 
                 # Écriture table DocFrom
-                docFrom = d.get("from").split(";")
-                self.docFrom[id] = docFrom
+                self.appendDocFrom(source)
 
                 # Initialisation stems
                 for s in st:
-                    if s in self.stems.keys():
-                        self.stems[s] = (-1, self.stems[s][1] + len(id) + len(str(st[s])) + 2)
-                    else:
-                        self.stems[s] = (-1, len(id) + len(str(st[s])) + 3)
+                    o = ordinals[s]
+                    self.stemSizes[o] += len(id) + len(str(st[s])) + (2 if self.stemDfs[o] else 1)
+
+                    # Statistiques du stem : nombre de documents, tf maximal, nombre d'occurrences
+                    self.stemDfs[o] += 1
+                    self.stemMaxTfs[o] = max(self.stemMaxTfs[o], st[s])
+                    self.stemCfs[o] += st[s]
+
+                    # Forme de la liste binaire : taille, dernier ordinal, écart et tf maximaux
+                    if self.encoding == "binary" and self.memory is None:
+                        n, last, maxgap, maxtf = self.shapes.get(s, (0, 0, 0, 0))
+                        self.shapes[s] = (n + 1, ordinal, max(maxgap, ordinal - last), max(maxtf, st[s]))
+
+                # Accumulation des postings : ordinaux et tfs de chaque stem
+                # dans deux tableaux, dont la taille réelle est décomptée
+                if self.memory is not None:
+                    for s in st:
+                        if s not in postings:
+                            postings[s] = (array("I"), array("I"))
+                            size += _bufferStemSize
+                        ords, tfs = postings[s]
+                        ords.append(ordinal)
+                        tfs.append(st[s])
+                        size += ords.itemsize + tfs.itemsize
+
+                    if size > self.memory:
+                        runs.append(self.writeRun(postings, len(runs)))
+                        postings = {}
+                        size = 0
 
                 # Itération
                 ifcur = nfcur
-                d = self.parser.nextDocument()
+
+            if postings:
+                runs.append(self.writeRun(postings, len(runs)))
+
+            if self.positions:
+                self.writePositionsTable(pfile)
 
             log.info("\b" * 4 + "\033[1;32mTerminé\033[0m\n")
 
+        self.docIds = IdList(self.docIds)
+        self.stemIds = IdList(self.stemIds)
+        return runs
+
+    def writePositionsTable(self, pfile):
+        """
+            Écrit la fin de <name>_positions : table des positions des enregistrements et pied de page
+
+            :param pfile: Fichier <name>_positions, après le dernier enregistrement
+            :type pfile: file
+        """
+
+        offset = pfile.tell()
+        self.posOffsets.append(offset)
+        table = array("Q", self.posOffsets)
+        if sys.byteorder == "big":
+            table.byteswap()
+        pfile.write(table.tobytes() + _positionsFooter.pack(offset))
+
+    def appendLengths(self, st):
+        """
+            Ajoute la longueur et la norme du prochain document aux tables des documents
+
+            Les stems des champs (voir analyseDocument()) ne comptent que
+            dans la longueur de leur champ : la longueur et la norme du
+            document ne portent que sur son texte complet.
+
+            :param st: Représentation stem-tf du document
+            :type st: dict
+        """
+
+        if not self.fields:
+            self.docLengths.append(sum(st.values()))
+            self.docNorms.append(math.sqrt(sum(tf * tf for tf in st.values())))
+            self.length += self.docLengths[-1]
+            return
+
+        lengths = dict.fromkeys(self.fields, 0)
+        length = norm = 0
+        for s, tf in st.items():
+            field, dot, stem = s.partition(".")
+            if dot:
+                lengths[field] += tf
+            else:
+                length += tf
+                norm += tf * tf
+        self.docLengths.append(length)
+        self.docNorms.append(math.sqrt(norm))
+        self.length += length
+        for i, n in enumerate(lengths.values()):
+            self.fieldLengths[i].append(n)
+            self.fieldTotals[i] += n
+
+    def appendDocFrom(self, source):
+        """
+            Ajoute la source du prochain document à la table des documents
+
+            :param source: Source du document, "chemin;début;taille"
+            :type source: str
+        """
+
+        path, start, nbBytes = source.split(";")
+        if path not in self.sources:
+            self.sources.append(path)
+        self.docSources.append(self.sources.index(path))
+        self.docStarts.append(int(start))
+        self.docBytes.append(int(nbBytes))
+
+    def indexParallel(self):
+        """
+            Effectue l'indexation normale du corpus dans un groupe de processus
+
+            Le corpus est découpé en tranches contiguës de documents, d'après
+            leurs positions de début. Chaque tranche est indexée par un
+            processus de travail comme un petit index temporaire
+            <name>_part<k> (voir indexPart()), distinct des shards
+            <name>_shard<k> de ShardedIndex : analyse, enregistrements de
+            <name>_part<k>_index et <name>_part<k>_positions, statistiques des
+            stems et paquets de postings triés par stem. Le processus
+            principal ne fait que numéroter les stems dans l'ordre de leur
+            première apparition, cumuler les tables et concaténer les
+            fichiers ; au format binaire, les enregistrements d'une tranche dont les
+            ordinaux locaux diffèrent des ordinaux globaux sont réécrits par
+            un processus de travail (voir remapStems()). Les paquets sont
+            ensuite fusionnés par mergeInversed() : l'index écrit est
+            identique à celui d'une indexation séquentielle avec budget
+            mémoire.
+
+            Le parseur et la représentation (avec son éventuel cache) ne sont
+            transmis qu'une fois à chaque processus, qui se partagent le
+            budget mémoire (sans budget, une tranche forme un seul paquet).
+
+            :return: Chemins des paquets de postings écrits et ordinal du
+                     premier document de chacun
+            :rtype: tuple(list, list)
+        """
+
+        self.parser.initFile(self.source)
+        offsets = self.parser.documentOffsets()
+        step = max(1, len(offsets) // (8 * self.workers))
+        bounds = offsets[::step] + [None]
+        memory = math.inf if self.memory is None else self.memory // self.workers
+        tasks = [(self.name + "_part" + str(k), self.source, a, b, memory)
+                 for k, (a, b) in enumerate(zip(bounds, bounds[1:]))]
+
+        runs = []
+        bases = []
+        parts = []
+        ordinals = self.ordinals = {}
+        self.shapes = {}
+        self.posOffsets = array("Q")
+
+        with multiprocessing.Pool(self.workers, initWorker,
+                                  (self.parser, self.textRep, self.positions, self.fields, self.encoding)) as pool:
+            for k, (part, partRuns) in enumerate(pool.imap(indexPart, tasks)):
+                per = (k + 1) / len(tasks)
+                log.info("\rIndexation normale [" + "█"*int(50*per) + " "*(50-int(50*per)) + "] " + str(int(100*per)) + "%")
+
+                # Numérotation globale des stems de la tranche
+                mapping = array("I")
+                for s in part.stemIds:
+                    if s not in ordinals:
+                        ordinals[s] = len(self.stemIds)
+                        self.stemIds.append(s)
+                        self.stemSizes.append(0)
+                        self.stemDfs.append(0)
+                        self.stemMaxTfs.append(0)
+                        self.stemCfs.append(0)
+                    mapping.append(ordinals[s])
+
+                for o, df, maxtf, cf in zip(mapping, part.stemDfs, part.stemMaxTfs, part.stemCfs):
+                    self.stemDfs[o] += df
+                    self.stemMaxTfs[o] = max(self.stemMaxTfs[o], maxtf)
+                    self.stemCfs[o] += cf
+
+                runs.extend(partRuns)
+                bases.extend([len(self.docIds)] * len(partRuns))
+
+                # Tables des documents
+                for path in part.sources:
+                    if path not in self.sources:
+                        self.sources.append(path)
+                self.docSources.extend([self.sources.index(part.sources[n]) for n in part.docSources])
+                self.docIds.extend(part.docIds)
+                self.docStarts.extend(part.docStarts)
+                self.docBytes.extend(part.docBytes)
+                self.docLengths.extend(part.docLengths)
+                self.docNorms.extend(part.docNorms)
+                self.length += part.length
+                for i, lengths in enumerate(part.fieldLengths):
+                    self.fieldLengths[i].extend(lengths)
+                    self.fieldTotals[i] += part.fieldTotals[i]
+
+                if self.encoding == "binary" and mapping != array("I", range(len(mapping))):
+                    parts.append((part, pool.apply_async(remapPart, ((part, mapping),))))
+                else:
+                    parts.append((part, None))
+
+            # Concaténation des enregistrements des tranches
+            pfile = open("./" + self.name + "_positions", "wb") if self.positions else contextlib.nullcontext()
+            with open("./" + self.name + "_index", "wb") as ifile, pfile:
+                for part, remapped in parts:
+                    if remapped is not None:
+                        part.docOffsets, part.docSizes, part.posOffsets = remapped.get()
+                    offset = ifile.tell()
+                    self.docOffsets.extend([offset + o for o in part.docOffsets])
+                    self.docSizes.extend(part.docSizes)
+                    with open("./" + part.name + "_index", "rb") as f:
+                        shutil.copyfileobj(f, ifile)
+                    os.remove("./" + part.name + "_index")
+
+                    if self.positions:
+                        offset = pfile.tell()
+                        self.posOffsets.extend([offset + o for o in part.posOffsets[:-1]])
+                        with open("./" + part.name + "_positions", "rb") as f:
+                            pfile.write(f.read(part.posOffsets[-1]))
+                        os.remove("./" + part.name + "_positions")
+
+                if self.positions:
+                    self.writePositionsTable(pfile)
+
+        log.info("\b" * 4 + "\033[1;32mTerminé\033[0m\n")
+
+        self.docIds = IdList(self.docIds)
+        self.stemIds = IdList(self.stemIds)
+        return runs, bases
+
+    def remapStems(self, ordinals):
+        """
+            Réécrit les enregistrements de <name>_index et <name>_positions avec d'autres ordinaux de stems
+
+            Utilisé pour une tranche indexée par un processus de travail,
+            dont les stems sont numérotés localement (voir indexParallel()).
+
+            :param ordinals: Nouvel ordinal de chaque stem
+            :type ordinals: dict
+        """
+
+        with open("./" + self.name + "_index", "rb") as f:
+            records = f.read()
+        if self.positions:
+            with open("./" + self.name + "_positions", "rb") as f:
+                positions = f.read()
+
+        docOffsets, docSizes, posOffsets = array("Q"), array("I"), array("Q")
+        pfile = open("./" + self.name + "_positions", "wb") if self.positions else contextlib.nullcontext()
+        with open("./" + self.name + "_index", "wb") as ifile, pfile:
+            for k, (o, n) in enumerate(zip(self.docOffsets, self.docSizes)):
+                st = self.readDoc(records[o:o + n])
+                docOffsets.append(ifile.tell())
+                ifile.write(self.writeDoc(st, ordinals))
+                docSizes.append(ifile.tell() - docOffsets[-1])
+                if self.positions:
+                    posOffsets.append(pfile.tell())
+                    b = positions[self.posOffsets[k]:self.posOffsets[k + 1]]
+                    pfile.write(self.writePositions(self.readPositions(b, st), ordinals))
+
+            self.docOffsets, self.docSizes, self.posOffsets = docOffsets, docSizes, posOffsets
+            if self.positions:
+                self.writePositionsTable(pfile)
+
+    def writeRun(self, postings, n):
+        """
+            Écrit sur disque un paquet de postings trié par stem
+
+            Chaque stem est écrit sur une ligne avec la taille de sa liste
+            doc-tf, suivie de cette liste encodée dans le format de l'index.
+
+            :param postings: Ordinaux et tfs de chaque stem
+            :param n: Numéro du paquet
+            :type postings: dict
+            :type n: int
+            :return: Chemin du fichier écrit
+            :rtype: str
+        """
+
+        path = "./" + self.name + "_run" + str(n)
+        with open(path, "wb") as rfile:
+            for s in sorted(postings):
+                p = self.writePostings(*postings[s])
+                rfile.write((s + ' ' + str(len(p)) + '\n').encode())
+                rfile.write(p)
+        return path
+
+    def readRun(self, path, n):
+        """
+            Lit séquentiellement un paquet de postings
+
+            :param path: Chemin du fichier
+            :param n: Numéro du paquet
+            :type path: str
+            :type n: int
+            :return: Générateur de triplets (stem, numéro du paquet, postings)
+            :rtype: generator
+        """
+
+        with open(path, "rb") as rfile:
+            for line in rfile:
+                s, l = line.split()
+                yield s.decode(), n, rfile.read(int(l))
+
 
 
     def prepareInversed(self):
@@ -168,10 +744,62 @@ class Index(object):
         """
 
         offset = 0
-        for k, (o, l) in self.stems.items():
-            self.stems[k] = (offset, l)
-            offset+= l + len(k) + 1
+        self.stemOffsets = array("Q")
+        for k, s in enumerate(self.stemIds):
+            if self.encoding == "binary":
+                n, last, maxgap, maxtf = self.shapes[s]
+                self.stemSizes[k] = codec.size(n, maxgap, maxtf)
+            self.stemOffsets.append(offset)
+            offset+= self.stemSizes[k]
+
 
+    def mergeInversed(self, runs, bases=None):
+        """
+            Indexation inversée par fusion des paquets de postings
+
+            Les paquets écrits par indexDirect() ou indexParallel() sont
+            fusionnés en un seul parcours, ce qui permet d'écrire l'index
+            inversé de façon séquentielle, un stem après l'autre.
+
+            :param runs: Chemins des paquets à fusionner, dans l'ordre des documents
+            :param bases: Ordinal du premier document de chaque paquet, si
+                          ses documents sont numérotés à partir de 0
+            :type runs: list
+            :type bases: list
+        """
+
+        with open("./" + self.name + "_inverted", "wb") as ifile:
+            offset = 0
+            stem = None
+            chunks = []
+            shifts = []
+            self.stemOffsets = array("Q", bytes(8 * len(self.stemIds)))
+
+            log.info("\rIndexation inverse (fusion de " + str(len(runs)) + " paquets)")
+
+            for s, n, p in heapq.merge(*[self.readRun(r, n) for n, r in enumerate(runs)]):
+                if s != stem and chunks:
+                    p_stem = self.joinPostings(chunks, shifts)
+                    ifile.write(p_stem)
+                    self.stemOffsets[self.ordinals[stem]] = offset
+                    self.stemSizes[self.ordinals[stem]] = len(p_stem)
+                    offset += len(p_stem)
+                    chunks = []
+                    shifts = []
+                stem = s
+                chunks.append(p)
+                shifts.append(bases[n] if bases else 0)
+
+            if chunks:
+                p_stem = self.joinPostings(chunks, shifts)
+                ifile.write(p_stem)
+                self.stemOffsets[self.ordinals[stem]] = offset
+                self.stemSizes[self.ordinals[stem]] = len(p_stem)
+
+            log.info("\033[1;32m Terminé\033[0m\n")
+
+        for r in runs:
+            os.remove(r)
 
     def indexInversed(self):
         """
@@ -181,12 +809,13 @@ class Index(object):
         with open("./" + self.name + "_index", "rb") as wfile:
             with open("./" + self.name + "_inverted", "wb") as ifile:
 
-                offset = dict.fromkeys(self.stems, 0)
+                offset = array("I", bytes(4 * len(self.stemIds)))
+                last = array("I", bytes(4 * len(self.stemIds)))
 
-                log_size = len(self.docs)
+                log_size = len(self.docIds)
                 log_accu = 0
 
-                for d, (o, r) in self.docs.items():
+                for d, o, r in zip(self.docIds, self.docOffsets, self.docSizes):
                     log_accu+= 1
                     per = log_accu/log_size
                     log.info("\rIndexation inverse [" + "█"*int(50*per) + " "*(50-int(50*per)) + "] " + str(int(100*per)) + "%")
@@ -195,17 +824,368 @@ class Index(object):
                         st = self.index[d]
                     else:
                         wfile.seek(o)
-                        st = self.readDict(wfile.read(r))
+                        st = self.readDoc(wfile.read(r))
+
+                    # Ecriture binaire : en-tête, puis écart et tf dans leurs tableaux respectifs
+                    if self.encoding == "binary":
+                        ordinal = log_accu - 1
+                        for s in st:
+                            k = self.ordinals[s]
+                            n, _, maxgap, maxtf = self.shapes[s]
+                            g, t = codec.code(maxgap), codec.code(maxtf)
+                            gap, tf = codec.pack([ordinal - last[k]], g), codec.pack([st[s]], t)
+                            if not offset[k]:
+                                ifile.seek(self.stemOffsets[k])
+                                ifile.write(codec.header(maxgap, maxtf))
+                            ifile.seek(self.stemOffsets[k] + 1 + offset[k] * len(gap))
+                            ifile.write(gap)
+                            ifile.seek(self.stemOffsets[k] + 1 + n * len(gap) + offset[k] * len(tf))
+                            ifile.write(tf)
+                            offset[k] += 1
+                            last[k] = ordinal
+                        continue
 
                     # Ecriture doc-tf
                     for s in st:
-                        w = d + ':' + s + ';'
-                        ifile.seek(self.stems[s][0] + offset[s])
-                        offset[s] += len(w)
+                        k = self.ordinals[s]
+                        w = d + ':' + str(st[s])
+                        if offset[k]:
+                            w = ';' + w
+                        ifile.seek(self.stemOffsets[k] + offset[k])
+                        offset[k] += len(w)
                         ifile.write(w.encode())
 
                 log.info("\b" * 4 + "\033[1;32mTerminé\033[0m\n")
 
+    def save(self):
+        """
+            Écrit les métadonnées de l'index dans les fichiers <name>_meta et <name>_lexicon
+
+            Le fichier <name>_meta commence par une ligne d'en-tête JSON
+            (format, statistiques du corpus, position des sections), suivie
+            de la table des documents (identifiant, position et taille de
+            l'enregistrement, source, longueur et norme). Le lexique (stem,
+            ordinal, position et taille de la liste de postings, nombre de
+            documents, tf maximal et nombre d'occurrences) est écrit trié et
+            compressé dans <name>_lexicon (voir Lexicon), et les tables de
+            sauts des longues listes dans <name>_skips (voir writeSkips()).
+            Pour un index positionnel, le fichier <name>_positions est écrit
+            par indexDirect(). Pour un index à champs, la longueur de chaque
+            champ des documents suit la table des documents. Ces fichiers
+            remplacent la sérialisation de l'objet complet et suffisent à
+            Index.open().
+
+            Les ajouts et suppressions en attente doivent d'abord être
+            fusionnés avec merge().
+        """
+
+        if self.deltaDocs or self.nbDeleted:
+            raise RuntimeError("Modifications en attente : appeler merge() avant save()")
+
+        Lexicon.write("./" + self.name + "_lexicon",
+                      ((s, (k, self.stemOffsets[k], self.stemSizes[k], self.stemDfs[k], self.stemMaxTfs[k],
+                            self.stemCfs[k])) for s, k in self.stemIds.sorted()))
+        self.lexicon = None
+        self.writeSkips()
+
+        table = "".join([d + " " + str(o) + " " + str(l) + " " + str(src) + " " + str(start) + " " + str(nbBytes)
+                         + " " + str(n) + " " + repr(norm) + "\n"
+                         for d, o, l, src, start, nbBytes, n, norm in zip(self.docIds, self.docOffsets, self.docSizes,
+                                                                          self.docSources, self.docStarts,
+                                                                          self.docBytes, self.docLengths,
+                                                                          self.docNorms)]).encode()
+        lengths = "".join([" ".join(map(str, values)) + "\n" for values in zip(*self.fieldLengths)]).encode()
+
+        meta = {
+            "encoding": self.encoding,
+            "positions": self.positions,
+            "fields": self.fields,
+            "fieldTotals": self.fieldTotals,
+            "source": self.source,
+            "sources": self.sources,
+            "docs": len(self.docIds),
+            "stems": len(self.stemIds),
+            "length": self.length,
+            "size": {suffix: os.path.getsize("./" + self.name + suffix) for suffix in ("_index", "_inverted")},
+            "table": [0, len(table)],
+            "lengths": [len(table), len(lengths)],
+        }
+
+        with open("./" + self.name + "_meta", "wb") as mfile:
+            mfile.write(json.dumps(meta).encode() + b"\n")
+            mfile.write(table)
+            mfile.write(lengths)
+
+    def writeSkips(self):
+        """
+            Écrit les tables de sauts des longues listes de postings dans <name>_skips
+
+            Les listes de plus de Index.blockSize postings sont découpées en
+            blocs de Index.blockSize postings. Pour chaque bloc, la table
+            donne les ordinaux de son premier et de son dernier document, son
+            tf maximal, la plus petite longueur de ses documents et sa
+            position dans la liste : un curseur (voir getCursor()) peut
+            sauter un bloc, ou majorer les scores de ses documents, sans le
+            décoder. Les listes elles-mêmes ne sont pas modifiées.
+
+            Le fichier contient les tables, dans l'ordre des ordinaux des
+            stems, suivies des ordinaux des stems concernés et de la position
+            de leur table, puis d'un pied de page (position de cet index,
+            nombre de tables, taille des blocs).
+        """
+
+        size = self.blockSize
+        stems, offsets = array("I"), array("I")
+        with open("./" + self.name + "_inverted", "rb") as ifile:
+            with open("./" + self.name + "_skips", "wb") as sfile:
+                offset = 0
+                for k in range(len(self.stemOffsets)):
+                    if self.stemDfs[k] <= size:
+                        continue
+                    ifile.seek(self.stemOffsets[k])
+                    b = ifile.read(self.stemSizes[k])
+                    ords, tfs = self.readPostings(b)
+                    n = len(ords)
+                    if self.encoding == "binary":
+                        gw, tw = codec.widths(b[0])
+                        starts = range(1, 1 + n * gw, size * gw)
+                    else:
+                        starts = list(accumulate((len(p) + 1 for p in b.split(b";")), initial=0))[0:n:size]
+                    table = b"".join(codec.pack(values, 2) for values in (
+                        ords[0::size], [ords[min(i + size, n) - 1] for i in range(0, n, size)],
+                        [max(tfs[i:i + size]) for i in range(0, n, size)],
+                        [min(self.docLengths[o] for o in ords[i:i + size]) for i in range(0, n, size)], starts))
+                    sfile.write(table)
+                    stems.append(k)
+                    offsets.append(offset)
+                    offset += len(table)
+                offsets.append(offset)
+                sfile.write(codec.pack(stems, 2) + codec.pack(offsets, 2))
+                sfile.write(_skipsFooter.pack(offset, len(stems), size))
+
+        self.skipStems, self.skipOffsets, self.skipSize = stems, offsets, size
+
+    @classmethod
+    def open(cls, name, textRepresenter=None, cache=None):
+        """
+            Ouvre un index existant à partir de son fichier de métadonnées
+
+            Seuls l'en-tête et l'index des blocs du lexique sont lus à
+            l'ouverture : les stems sont recherchés directement dans le
+            fichier <name>_lexicon. Le lexique complet et la table des
+            documents sont chargés au premier accès à Index.stemIds ou
+            Index.docIds (ou à l'un des tableaux associés).
+
+            :param name: Nom de l'index
+            :param textRepresenter: Représentation à utiliser pour les requêtes
+            :param cache: Mémoire allouée au cache des listes de postings, en octets
+            :type name: str
+            :type textRepresenter: TextRepresenter
+            :type cache: int
+            :return: Index prêt à être interrogé
+            :rtype: Index
+        """
+
+        self = cls.__new__(cls)
+        with open("./" + name + "_meta", "rb") as mfile:
+            self.meta = json.loads(mfile.readline().decode())
+            self.metaOffset = mfile.tell()
+
+        self.name = name
+        self.parser = None
+        self.textRep = textRepresenter
+        self.source = self.meta["source"]
+        self.keep_alive = False
+        self.memory = None
+        self.workers = 1
+        self.encoding = self.meta["encoding"]
+        self.positions = self.meta.get("positions", False)
+        self.fields = self.meta.get("fields", [])
+        self.fieldTotals = self.meta.get("fieldTotals", [])
+        self.sources = self.meta["sources"]
+        # Un index écrit par une version antérieure garde son lexique dans <name>_meta
+        self.lexicon = None if "lexicon" in self.meta else Lexicon.Lexicon("./" + name + "_lexicon")
+        self.length = self.meta["length"]
+        self.delta = {}
+        self.deltaDocs = {}
+        self.deleted = bytearray()
+        self.nbDeleted = 0
+        self.setCache(cache)
+        return self
+
+    def load(self, section):
+        """
+            Charge une section du fichier de métadonnées
+
+            :param section: Section à charger, "lexicon", "table", "lengths"
+                            (longueurs des champs), "skips" (index du fichier
+                            <name>_skips) ou "positions" (table du fichier
+                            <name>_positions)
+            :type section: str
+        """
+
+        if section == "positions":
+            with open("./" + self.name + "_positions", "rb") as pfile:
+                end = pfile.seek(-_positionsFooter.size, os.SEEK_END)
+                offset, = _positionsFooter.unpack(pfile.read(_positionsFooter.size))
+                pfile.seek(offset)
+                self.posOffsets = array("Q")
+                self.posOffsets.frombytes(pfile.read(end - offset))
+            if sys.byteorder == "big":
+                self.posOffsets.byteswap()
+            return
+
+        if section == "skips":
+            self.skipStems, self.skipOffsets, self.skipSize = array("I"), array("I", [0]), self.blockSize
+            path = "./" + self.name + "_skips"
+            # Un index écrit par une version antérieure n'a pas de tables de sauts
+            if os.path.exists(path):
+                with open(path, "rb") as sfile:
+                    end = sfile.seek(-_skipsFooter.size, os.SEEK_END)
+                    offset, n, self.skipSize = _skipsFooter.unpack(sfile.read(_skipsFooter.size))
+                    sfile.seek(offset)
+                    columns = array("I")
+                    columns.frombytes(sfile.read(end - offset))
+                if sys.byteorder == "big":
+                    columns.byteswap()
+                self.skipStems, self.skipOffsets = columns[:n], columns[n:]
+            return
+
+        if section == "lengths":
+            self.fieldLengths = [array("I") for f in self.fields]
+            if self.fields:
+                o, l = self.meta["lengths"]
+                with open("./" + self.name + "_meta", "rb") as mfile:
+                    mfile.seek(self.metaOffset + o)
+                    values = array("I", map(int, mfile.read(l).split()))
+                self.fieldLengths = [values[i::len(self.fields)] for i in range(len(self.fields))]
+            return
+
+        if section == "lexicon" and self.lexicon is not None:
+            entries, n = iter(self.lexicon), len(self.lexicon)
+        else:
+            o, l = self.meta[section]
+            with open("./" + self.name + "_meta", "rb") as mfile:
+                mfile.seek(self.metaOffset + o)
+                lines = mfile.read(l).decode().splitlines()
+            entries = ((s, tuple(map(int, values))) for s, *values in map(str.split, lines))
+            n = len(lines)
+
+        if section == "lexicon":
+            # Le lexique est trié par stem : ses ordinaux forment la permutation de Index.stemIds
+            stemIds = [None] * n
+            order = array("I")
+            columns = [array(t, bytes(array(t).itemsize * n)) for t in "QIIII"]
+            for s, (k, *values) in entries:
+                stemIds[k] = s
+                order.append(k)
+                for c, v in zip(columns, values):
+                    c[k] = v
+            self.stemIds = IdList(stemIds, order)
+            self.stemOffsets, self.stemSizes, self.stemDfs, self.stemMaxTfs, self.stemCfs = columns
+        else:
+            docIds = []
+            columns = [array(t) for t in "QIIQII"]
+            self.docNorms = array("d")
+            for line in lines:
+                d, *values, norm = line.split()
+                docIds.append(d)
+                for c, v in zip(columns, values):
+                    c.append(int(v))
+                self.docNorms.append(float(norm))
+            self.docIds = IdList(docIds)
+            self.docOffsets, self.docSizes, self.docSources, self.docStarts, self.docBytes, self.docLengths = columns
+
+    def __getattr__(self, key):
+        # Chargement paresseux des tables d'un index ouvert par Index.open()
+        if key in ("stemIds", "stemOffsets", "stemSizes", "stemDfs", "stemMaxTfs", "stemCfs"):
+            self.load("lexicon")
+        elif key in ("docIds", "docOffsets", "docSizes", "docSources", "docStarts", "docBytes", "docLengths",
+                     "docNorms"):
+            self.load("table")
+        elif key in ("skipStems", "skipOffsets", "skipSize"):
+            self.load("skips")
+        elif key == "posOffsets" and self.positions:
+            self.load("positions")
+        elif key == "fieldLengths":
+            self.load("lengths")
+        else:
+            raise AttributeError(key)
+        return self.__dict__[key]
+
+    def map(self):
+        """
+            Projette les fichiers d'index en mémoire
+
+            Les fichiers sont ouverts une seule fois et projetés avec mmap
+            (le lexique aussi, s'il est lu sur disque) ; les lectures suivantes ne sont plus que des tranches de
+            mémoire, sans appel système ni copie. Les fichiers doivent être
+            projetés à nouveau après une réindexation.
+
+            .. seealso:: close()
+        """
+
+        self.close()
+        maps = {}
+        for suffix in ("_index", "_inverted", "_skips", "_positions"):
+            if suffix in ("_skips", "_positions") and not os.path.exists("./" + self.name + suffix):
+                continue
+            with open("./" + self.name + suffix, "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    maps[suffix] = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        self.maps = maps
+        if self.lexicon is not None:
+            self.lexicon.map()
+
+    def close(self):
+        """
+            Libère les fichiers projetés par map()
+        """
+
+        for view in self.maps.values():
+            m = view.obj
+            view.release()
+            m.close()
+        self.maps = {}
+        if self.lexicon is not None:
+            self.lexicon.close()
+
+    def __getstate__(self):
+        # Les projections mémoire ne sont pas transmises aux processus de travail
+        state = self.__dict__.copy()
+        state.pop("maps", None)
+        return state
+
+    def __enter__(self):
+        self.map()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, suffix, offset, length):
+        """
+            Lit un enregistrement dans un fichier d'index
+
+            Si les fichiers ont été projetés par map(), retourne une vue sur
+            la mémoire projetée ; sinon, le fichier est ouvert le temps de la
+            lecture.
+
+            :param suffix: Fichier à lire, "_index", "_inverted", "_skips" ou "_positions"
+            :param offset: Position de l'enregistrement
+            :param length: Taille de l'enregistrement
+            :type suffix: str
+            :type offset: int
+            :type length: int
+            :rtype: bytes-like
+        """
+
+        if suffix in self.maps:
+            return self.maps[suffix][offset:offset + length]
+        with open("./" + self.name + suffix, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
     def getTfsForDoc(self, doc):
         """
             Retourne la représentation stem-tf d'un document depuis l'index
@@ -219,9 +1199,12 @@ class Index(object):
             :return: Représentation stem-tf
             :rtype: dict
         """
-        ifile = open("./" + self.name + "_index", "rb")
-        ifile.seek(self.docs[doc][0])
-        return self.readDict(ifile.read1(self.docs[doc][1]))
+        if doc in self.deltaDocs:
+            return dict(self.deltaDocs[doc][1])
+        ordinal = self.getDocOrdinal(doc)
+        if self.nbDeleted and self.isDeleted(ordinal):
+            raise KeyError(doc)
+        return self.readDoc(self.read("_index", self.docOffsets[ordinal], self.docSizes[ordinal]))
 
     def getTfsForStem(self, stem):
         """
@@ -237,13 +1220,575 @@ class Index(object):
             :return: Représentation doc-tf
             :rtype: dict
         """
-        ifile = open("./" + self.name + "_inverted", "rb")
-        try:
-            ifile.seek(self.stems[stem][0])
-            dic = self.readDict(ifile.read1(self.stems[stem][1]))
-        except KeyError:
-            dic = dict()
-        return dic
+        if self.delta or self.nbDeleted or self.cache is not None:
+            ords, tfs = self.getPostings(stem)
+            return dict(zip(map(self.docIds.__getitem__, ords), tfs))
+        entry = self.getStemEntry(stem)
+        if entry is None or not entry[2]:
+            return dict()
+        b = self.read("_inverted", entry[1], entry[2])
+        if self.encoding == "text":
+            return self.readDict(b)
+        ords, tfs = codec.decode(b)
+        return dict(zip(map(self.docIds.__getitem__, ords), tfs))
+
+    def getDocOrdinal(self, doc):
+        """
+            Retourne l'ordinal d'un document, son rang dans Index.docIds
+
+            Un document ajouté depuis la dernière fusion a pour ordinal le
+            dernier qui lui a été attribué.
+
+            :param doc: Identifiant du document
+            :type doc: str
+            :rtype: int
+        """
+        if doc in self.deltaDocs:
+            return self.deltaDocs[doc][0]
+        ordinal = self.docIds.find(doc)
+        if ordinal < 0:
+            raise KeyError(doc)
+        return ordinal
+
+    def getStemEntry(self, stem):
+        """
+            Retourne l'entrée d'un stem dans le lexique (None s'il est inconnu)
+
+            Tant que le lexique n'a pas été chargé en mémoire, l'entrée est
+            lue dans le fichier <name>_lexicon. Les stems apparus depuis la
+            dernière fusion n'ont pas de liste dans l'index inversé (position
+            et taille nulles).
+
+            :param stem: Stem recherché
+            :type stem: str
+            :return: Ordinal, position et taille de la liste de postings,
+                     df, tf maximal et cf
+            :rtype: tuple
+        """
+        if self.lexicon is not None and "stemIds" not in self.__dict__:
+            return self.lexicon.find(stem)
+        k = self.stemIds.find(stem)
+        if k < 0:
+            return None
+        if k < len(self.stemOffsets):
+            return k, self.stemOffsets[k], self.stemSizes[k], self.stemDfs[k], self.stemMaxTfs[k], self.stemCfs[k]
+        return k, 0, 0, self.stemDfs[k], self.stemMaxTfs[k], self.stemCfs[k]
+
+    def getStemOrdinal(self, stem):
+        """
+            Retourne l'ordinal d'un stem, son rang dans Index.stemIds (-1 s'il est inconnu)
+
+            Les stems apparus depuis la dernière fusion ont les derniers
+            ordinaux.
+
+            :param stem: Stem recherché
+            :type stem: str
+            :rtype: int
+        """
+        entry = self.getStemEntry(stem)
+        return -1 if entry is None else entry[0]
+
+    def getStemsWithPrefix(self, prefix):
+        """
+            Retourne les stems commençant par un préfixe donné, dans l'ordre
+
+            Le parcours est une recherche dichotomique suivie d'une lecture
+            séquentielle du lexique trié, sans le charger en mémoire.
+
+            :param prefix: Préfixe recherché
+            :type prefix: str
+            :rtype: list
+        """
+        if self.lexicon is not None and "stemIds" not in self.__dict__:
+            return [s for s, values in self.lexicon.prefix(prefix)]
+        return [s for s, k in self.stemIds.prefix(prefix)]
+
+    def getNbDocs(self):
+        """
+            Retourne le nombre de documents indexés
+
+            :rtype: int
+        """
+        return len(self.docLengths) - self.nbDeleted
+
+    def getDocLength(self, doc):
+        """
+            Retourne la longueur d'un document, en nombre de stems
+
+            :param doc: Identifiant du document
+            :type doc: str
+            :rtype: int
+        """
+        return self.docLengths[self.getDocOrdinal(doc)]
+
+    def getDocNorm(self, doc):
+        """
+            Retourne la norme euclidienne du vecteur des tfs d'un document
+
+            :param doc: Identifiant du document
+            :type doc: str
+            :rtype: float
+        """
+        return self.docNorms[self.getDocOrdinal(doc)]
+
+    def getAvgDocLength(self):
+        """
+            Retourne la longueur moyenne des documents
+
+            :rtype: float
+        """
+        return self.length / max(1, self.getNbDocs())
+
+    def getDf(self, stem):
+        """
+            Retourne le nombre de documents contenant un stem (0 s'il est inconnu)
+
+            :param stem: Stem recherché
+            :type stem: str
+            :rtype: int
+        """
+        entry = self.getStemEntry(stem)
+        return 0 if entry is None else entry[3]
+
+    def getMaxTf(self, stem):
+        """
+            Retourne le tf maximal d'un stem dans les documents (0 s'il est inconnu)
+
+            :param stem: Stem recherché
+            :type stem: str
+            :rtype: int
+        """
+        entry = self.getStemEntry(stem)
+        return 0 if entry is None else entry[4]
+
+    def getCf(self, stem):
+        """
+            Retourne le nombre d'occurrences d'un stem dans le corpus (0 s'il est inconnu)
+
+            :param stem: Stem recherché
+            :type stem: str
+            :rtype: int
+        """
+        entry = self.getStemEntry(stem)
+        return 0 if entry is None else entry[5]
+
+    def getPostings(self, stem):
+        """
+            Retourne la liste de postings d'un stem sous forme de tableaux
+
+            Variante de getTfsForStem() qui évite la construction d'un
+            dictionnaire : les documents sont désignés par leur ordinal,
+            c'est-à-dire leur rang dans Index.docIds.
+
+            Les postings des documents ajoutés depuis la dernière fusion
+            suivent ceux de l'index principal, et ceux des documents
+            supprimés sont retirés.
+
+            Si un cache a été alloué (voir setCache()), les listes décodées
+            de l'index principal y sont conservées : les tableaux retournés
+            peuvent être partagés et ne doivent pas être modifiés.
+
+            :param stem: Stem recherché
+            :type stem: str
+            :return: Ordinaux des documents et tfs associés
+            :rtype: tuple(array, array)
+        """
+        postings = None if self.cache is None else self.cache.get(stem)
+        if postings is None:
+            entry = self.getStemEntry(stem)
+            if entry is not None and entry[2]:
+                postings = self.readPostings(self.read("_inverted", entry[1], entry[2]))
+                if self.cache is not None:
+                    self.cache.put(stem, postings)
+            else:
+                postings = array("I"), array("I")
+        ords, tfs = postings
+
+        if stem in self.delta:
+            ords = array("I", ords)
+            tfs = array("I", tfs)
+            ords.extend(self.delta[stem][0])
+            tfs.extend(self.delta[stem][1])
+
+        return self.removeDeleted(ords, tfs)
+
+    def removeDeleted(self, ords, tfs):
+        """
+            Retire d'une liste de postings les documents supprimés
+
+            :param ords: Ordinaux des documents
+            :param tfs: Tfs associés
+            :type ords: array
+            :type tfs: array
+            :return: Ordinaux et tfs des documents non supprimés
+            :rtype: tuple(array, array)
+        """
+        if self.nbDeleted:
+            live = [i for i, o in enumerate(ords) if not self.isDeleted(o)]
+            if len(live) < len(ords):
+                ords = array("I", [ords[i] for i in live])
+                tfs = array("I", [tfs[i] for i in live])
+        return ords, tfs
+
+    def getSkips(self, ordinal):
+        """
+            Retourne la table de sauts de la liste de postings d'un stem
+
+            .. seealso:: writeSkips()
+
+            :param ordinal: Ordinal du stem
+            :type ordinal: int
+            :return: Premiers ordinaux, derniers ordinaux, tfs maximaux,
+                     longueurs minimales et positions des blocs (None si la
+                     liste n'est pas découpée)
+            :rtype: tuple
+        """
+        i = bisect_left(self.skipStems, ordinal)
+        if i == len(self.skipStems) or self.skipStems[i] != ordinal:
+            return None
+        table = array("I")
+        table.frombytes(self.read("_skips", self.skipOffsets[i], self.skipOffsets[i + 1] - self.skipOffsets[i]))
+        if sys.byteorder == "big":
+            table.byteswap()
+        n = len(table) // 5
+        return table[:n], table[n:2 * n], table[2 * n:3 * n], table[3 * n:4 * n], table[4 * n:]
+
+    def readBlock(self, entry, skips, j):
+        """
+            Décode un bloc d'une liste de postings découpée par writeSkips()
+
+            Seuls les octets du bloc sont lus. Si un cache a été alloué
+            (voir setCache()), les blocs décodés y sont conservés.
+
+            :param entry: Entrée du stem dans le lexique (voir getStemEntry())
+            :param skips: Table de sauts de la liste (voir getSkips())
+            :param j: Numéro du bloc
+            :type entry: tuple
+            :type skips: tuple
+            :type j: int
+            :return: Ordinaux des documents non supprimés du bloc et tfs associés
+            :rtype: tuple(array, array)
+        """
+        key = (entry[0], j)
+        postings = None if self.cache is None else self.cache.get(key)
+        if postings is None:
+            k, offset, size = entry[:3]
+            firsts, starts = skips[0], skips[4]
+            start = starts[j]
+            if self.encoding == "binary":
+                h = self.read("_inverted", offset, 1)[0]
+                gw, tw = codec.widths(h)
+                n = (size - 1) // (gw + tw)
+                i = (start - 1) // gw
+                m = min(n - i, self.skipSize)
+                postings = codec.decodeBlock(h, self.read("_inverted", offset + start, m * gw),
+                                             self.read("_inverted", offset + 1 + n * gw + i * tw, m * tw), firsts[j])
+            else:
+                end = starts[j + 1] - 1 if j + 1 < len(starts) else size
+                postings = self.readPostings(self.read("_inverted", offset + start, end - start))
+            if self.cache is not None:
+                self.cache.put(key, postings)
+        return self.removeDeleted(*postings)
+
+    def getBlocks(self, stem):
+        """
+            Retourne la liste de postings d'un stem découpée en blocs
+
+            Les listes décrites par une table de sauts (voir writeSkips())
+            sont découpées en blocs décodés à la demande ; les autres forment
+            un seul bloc, lu par getPostings(). Les postings des documents
+            ajoutés depuis la dernière fusion forment un dernier bloc, et
+            ceux des documents supprimés sont retirés au décodage.
+
+            :param stem: Stem recherché
+            :type stem: str
+            :return: Quintuplets (premier ordinal, dernier ordinal, tf
+                     maximal, longueur minimale des documents, fonction de
+                     décodage), voir Cursor
+            :rtype: list
+        """
+        entry = self.getStemEntry(stem)
+        skips = None if entry is None or not entry[2] else self.getSkips(entry[0])
+        if skips is None:
+            ords, tfs = self.getPostings(stem)
+            if not len(ords):
+                return []
+            return [(ords[0], ords[-1], max(tfs), min(map(self.docLengths.__getitem__, ords)), lambda: (ords, tfs))]
+
+        firsts, lasts, maxTfs, minLengths, starts = skips
+        blocks = [(firsts[j], lasts[j], maxTfs[j], minLengths[j], functools.partial(self.readBlock, entry, skips, j))
+                  for j in range(len(firsts))]
+        if stem in self.delta:
+            ords, tfs = self.removeDeleted(*self.delta[stem])
+            if len(ords):
+                blocks.append((ords[0], ords[-1], max(tfs), min(map(self.docLengths.__getitem__, ords)),
+                               lambda: (ords, tfs)))
+        return blocks
+
+    def getCursor(self, stem):
+        """
+            Retourne un curseur sur la liste de postings d'un stem
+
+            Contrairement à getPostings(), la liste n'est pas décodée en
+            entier : seuls les blocs où le curseur s'arrête le sont (voir
+            Cursor).
+
+            :param stem: Stem recherché
+            :type stem: str
+            :rtype: Cursor
+        """
+        return Cursor.Cursor(self.getBlocks(stem))
+
+    def getPositions(self, ordinal, stems=None):
+        """
+            Retourne les positions des stems d'un document d'un index positionnel
+
+            La position d'un stem est le rang de son mot dans le texte du
+            document (voir TextRepresenter.getTextPositions()). Seuls sont
+            lus l'enregistrement du document dans l'index et celui de ses
+            positions.
+
+            :param ordinal: Ordinal du document
+            :param stems: Stems dont les positions sont demandées (tous par défaut)
+            :type ordinal: int
+            :type stems: set
+            :return: Positions croissantes de chaque stem
+            :rtype: dict
+        """
+        if not self.positions:
+            raise RuntimeError("L'index " + self.name + " n'est pas positionnel")
+        if ordinal >= len(self.docOffsets):
+            positions = self.deltaDocs[self.docIds[ordinal]][2]
+            return {s: p for s, p in positions.items() if stems is None or s in stems}
+        st = self.readDoc(self.read("_index", self.docOffsets[ordinal], self.docSizes[ordinal]))
+        start = self.posOffsets[ordinal]
+        return self.readPositions(self.read("_positions", start, self.posOffsets[ordinal + 1] - start), st, stems)
+
+    def setCache(self, budget):
+        """
+            Alloue (ou supprime) le cache des listes de postings décodées
+
+            Le cache est un LRU borné par la mémoire occupée par les listes :
+            une liste fréquemment demandée ne coûte plus qu'une recherche
+            dans un dictionnaire. Il peut être partagé entre plusieurs fils
+            d'exécution.
+
+            :param budget: Mémoire allouée, en octets (None pour supprimer le cache)
+            :type budget: int
+        """
+        self.cache = None if budget is None else Cache.LRUCache(budget, Cache.sizeofPostings)
+
+    def cacheInfo(self):
+        """
+            Retourne les statistiques du cache des listes de postings
+
+            .. seealso:: Cache.LRUCache.info()
+
+            :rtype: dict
+        """
+        return None if self.cache is None else self.cache.info()
+
+    def isDeleted(self, ordinal):
+        """
+            Indique si le document d'ordinal donné a été supprimé
+
+            :param ordinal: Ordinal du document
+            :type ordinal: int
+            :rtype: bool
+        """
+        return ordinal >> 3 < len(self.deleted) and bool(self.deleted[ordinal >> 3] >> (ordinal & 7) & 1)
+
+    def addDocument(self, doc):
+        """
+            Ajoute un document à l'index sans le reconstruire
+
+            Le document est analysé et ses postings sont conservés en
+            mémoire, dans un segment delta interrogé avec l'index principal ;
+            le coût d'un ajout ne dépend pas de la taille de l'index. Un
+            document déjà indexé sous le même identifiant est remplacé.
+
+            .. seealso:: merge()
+
+            :param doc: Document à ajouter
+            :type doc: Document
+        """
+
+        id = doc.getId()
+        previous = self.docIds.find(id)
+        if id in self.deltaDocs or (previous >= 0 and not self.isDeleted(previous)):
+            self.deleteDocument(id)
+
+        if self.positions:
+            positions = analyseDocument(doc, self.textRep, True, self.fields)
+            st = {s: len(p) for s, p in positions.items()}
+        else:
+            positions = None
+            st = analyseDocument(doc, self.textRep, False, self.fields)
+        ordinal = len(self.docIds)
+        self.docIds.append(id)
+        self.appendLengths(st)
+        self.appendDocFrom((doc.others or {}).get("from", ";0;0"))
+        self.deltaDocs[id] = (ordinal, st, positions)
+        if self.keep_alive:
+            self.index[id] = st
+
+        for s, tf in st.items():
+            o = self.stemIds.find(s)
+            if o < 0:
+                o = len(self.stemIds)
+                self.stemIds.append(s)
+                self.stemDfs.append(0)
+                self.stemMaxTfs.append(0)
+                self.stemCfs.append(0)
+            self.stemDfs[o] += 1
+            self.stemMaxTfs[o] = max(self.stemMaxTfs[o], tf)
+            self.stemCfs[o] += tf
+            ords, tfs = self.delta.setdefault(s, (array("I"), array("I")))
+            ords.append(ordinal)
+            tfs.append(tf)
+        self.version += 1
+
+    def deleteDocument(self, doc):
+        """
+            Supprime un document de l'index sans le reconstruire
+
+            Le document est marqué dans une table de bits et ignoré par les
+            lectures jusqu'à la prochaine fusion. Les statistiques du corpus
+            sont mises à jour (le tf maximal reste un majorant).
+
+            .. seealso:: merge()
+
+            :param doc: Identifiant du document
+            :type doc: str
+        """
+
+        st = self.getTfsForDoc(doc)
+        ordinal = self.getDocOrdinal(doc)
+        self.deltaDocs.pop(doc, None)
+
+        if ordinal >> 3 >= len(self.deleted):
+            self.deleted.extend(bytes((ordinal >> 3) + 1 - len(self.deleted)))
+        self.deleted[ordinal >> 3] |= 1 << (ordinal & 7)
+        self.nbDeleted += 1
+        self.length -= self.docLengths[ordinal]
+        for i, lengths in enumerate(self.fieldLengths):
+            self.fieldTotals[i] -= lengths[ordinal]
+
+        for s, tf in st.items():
+            o = self.stemIds.find(s)
+            self.stemDfs[o] -= 1
+            self.stemCfs[o] -= tf
+        self.version += 1
+
+    def liveDocuments(self):
+        """
+            Génère les documents non supprimés, dans l'ordre des ordinaux
+
+            :return: Générateur de triplets (id, source, stem-tf), ou (id,
+                     source, positions) pour un index positionnel
+            :rtype: generator
+        """
+
+        for ordinal, id in enumerate(self.docIds):
+            if self.isDeleted(ordinal):
+                continue
+            if self.positions:
+                st = self.getPositions(ordinal)
+            elif ordinal < len(self.docOffsets):
+                st = self.readDoc(self.read("_index", self.docOffsets[ordinal], self.docSizes[ordinal]))
+            else:
+                st = self.deltaDocs[id][1]
+            yield id, ";".join((self.sources[self.docSources[ordinal]], str(self.docStarts[ordinal]),
+                                str(self.docBytes[ordinal]))), st
+
+    def merge(self):
+        """
+            Fusionne le segment delta et les suppressions dans l'index principal
+
+            Les documents vivants sont réindexés, sans nouvelle analyse, dans
+            des fichiers temporaires qui remplacent ensuite ceux de l'index ;
+            les ordinaux sont renumérotés.
+        """
+
+        if not self.deltaDocs and not self.nbDeleted:
+            return
+
+        mapped = bool(self.maps)
+        merged = Index(self.name + "_merge", self.parser, self.textRep, self.source, self.keep_alive,
+                       self.memory, self.encoding, self.workers, positions=self.positions, fields=self.fields)
+        merged.indexation(self.liveDocuments(), self.getNbDocs())
+
+        self.close()
+        suffixes = ("_index", "_inverted", "_meta", "_lexicon", "_skips") + (("_positions",) if self.positions else ())
+        for suffix in suffixes:
+            os.replace("./" + merged.name + suffix, "./" + self.name + suffix)
+
+        merged.name = self.name
+        merged.cache = self.cache
+        merged.version = self.version + 1
+        if self.cache is not None:
+            self.cache.clear()
+        self.__dict__ = merged.__dict__
+        if mapped:
+            self.map()
+
+    def convert(self, encoding):
+        """
+            Convertit les fichiers d'index existants dans un autre format
+
+            Permet de migrer un index déjà construit sans relancer
+            l'indexation.
+
+            :param encoding: Nouveau format, "text" ou "binary"
+            :type encoding: str
+        """
+
+        if encoding == self.encoding:
+            return
+
+        self.close()
+
+        ordinals = {s: i for i, s in enumerate(self.stemIds)}
+
+        # Les positions sont réécrites d'abord : leur décodage suit l'ancien enregistrement de chaque document
+        if self.positions:
+            path = "./" + self.name + "_positions"
+            posOffsets = array("Q")
+            with open(path + "_tmp", "wb") as dst:
+                for k in range(len(self.docOffsets)):
+                    posOffsets.append(dst.tell())
+                    dst.write(self.writePositions(self.getPositions(k), ordinals, encoding))
+                offset = dst.tell()
+                posOffsets.append(offset)
+                table = array("Q", posOffsets)
+                if sys.byteorder == "big":
+                    table.byteswap()
+                dst.write(table.tobytes() + _positionsFooter.pack(offset))
+            os.replace(path + "_tmp", path)
+            self.posOffsets = posOffsets
+
+        for suffix, offsets, sizes in (("_index", self.docOffsets, self.docSizes),
+                                       ("_inverted", self.stemOffsets, self.stemSizes)):
+            path = "./" + self.name + suffix
+            with open(path, "rb") as src, open(path + "_tmp", "wb") as dst:
+                offset = 0
+                for k in range(len(offsets)):
+                    src.seek(offsets[k])
+                    if suffix == "_index":
+                        b = self.writeDoc(self.readDoc(src.read(sizes[k])), ordinals, encoding)
+                    else:
+                        b = self.writePostings(*self.readPostings(src.read(sizes[k])), encoding)
+                    dst.write(b)
+                    offsets[k] = offset
+                    sizes[k] = len(b)
+                    offset += len(b)
+            os.replace(path + "_tmp", path)
+
+        self.encoding = encoding
+        self.version += 1
+        if self.cache is not None:
+            self.cache.clear()
+        self.save()
 
     def getStrDoc(self, doc):
         """
@@ -257,6 +1802,128 @@ class Index(object):
             :return: Texte brut du document
             :rtype: str
         """
-        f = open(self.docFrom[0], "rb")
-        f.seek(self.docFrom[1])
-        return f.read1(self.docFrom[2])
+        ordinal = self.getDocOrdinal(doc)
+        with open(self.sources[self.docSources[ordinal]], "rb") as f:
+            f.seek(self.docStarts[ordinal])
+            return f.read(self.docBytes[ordinal]).decode()
+
+
+def analyse(parser, textRep, positions=False, fields=()):
+    """
+        Génère la représentation de chaque document lu par un parseur
+
+        :param parser: Parseur initialisé
+        :param textRep: Représentation à utiliser
+        :param positions: Indique s'il faut générer les positions des stems
+                          plutôt que leurs tfs
+        :param fields: Champs à indexer séparément (voir analyseDocument())
+        :type parser: Parser
+        :type textRep: TextRepresenter
+        :type positions: bool
+        :type fields: list
+        :return: Générateur de triplets (id, source, stem-tf), ou (id,
+                 source, positions)
+        :rtype: generator
+    """
+
+    for d in parser.iterDocuments():
+        yield d.getId(), d.get("from"), analyseDocument(d, textRep, positions, fields)
+
+
+def analyseDocument(doc, textRep, positions=False, fields=()):
+    """
+        Retourne la représentation d'un document
+
+        Les stems de chaque champ demandé (texte de Document.others, par
+        exemple "author" pour ParserCACM) sont ajoutés à ceux du texte
+        complet, préfixés par le nom du champ et un point ("author.pooch") :
+        un stem ne contenant jamais de point, ils ont leurs propres listes
+        de postings dans le même index.
+
+        :param doc: Document à analyser
+        :param textRep: Représentation à utiliser
+        :param positions: Indique s'il faut retourner les positions des
+                          stems plutôt que leurs tfs
+        :param fields: Champs à indexer séparément
+        :type doc: Document
+        :type textRep: TextRepresenter
+        :type positions: bool
+        :type fields: list
+        :return: Représentation stem-tf, ou positions de chaque stem
+        :rtype: dict
+    """
+
+    represent = textRep.getTextPositions if positions else textRep.getTextRepresentation
+    st = represent(doc.getText())
+    for field in fields:
+        for s, v in represent((doc.others or {}).get(field) or "").items():
+            st[field + "." + s] = v
+    return st
+
+
+worker = {}
+
+
+def initWorker(parser, textRep, positions=False, fields=(), encoding="text"):
+    """
+        Initialise un processus de travail de l'indexation
+
+        La progression n'est journalisée que par le processus principal.
+
+        :param parser: Parseur à utiliser
+        :param textRep: Représentation à utiliser
+        :param positions: Indique s'il faut indexer les positions des stems
+        :param fields: Champs à indexer séparément
+        :param encoding: Format des fichiers d'index
+        :type parser: Parser
+        :type textRep: TextRepresenter
+        :type positions: bool
+        :type fields: list
+        :type encoding: str
+    """
+
+    log.setLevel(logging.WARNING)
+    worker["parser"] = parser
+    worker["textRep"] = textRep
+    worker["positions"] = positions
+    worker["fields"] = fields
+    worker["encoding"] = encoding
+
+
+def indexPart(args):
+    """
+        Indexe une tranche du corpus dans un processus de travail
+
+        La tranche est indexée par indexDirect() comme un petit index, dont
+        les documents et les stems sont numérotés localement ; ses
+        métadonnées ne sont pas écrites.
+
+        :param args: Nom de la tranche, corpus, début et fin de la tranche, budget mémoire
+        :type args: tuple
+        :return: Index de la tranche et chemins de ses paquets de postings
+        :rtype: tuple(Index, list)
+    """
+
+    name, source, start, stop, memory = args
+    worker["parser"].initFile(source, start, stop)
+    part = Index(name, None, None, source, memory=memory, encoding=worker["encoding"],
+                 positions=worker["positions"], fields=worker["fields"])
+    runs = part.indexDirect(analyse(worker["parser"], worker["textRep"], worker["positions"], worker["fields"]))
+    del part.shapes, part.ordinals
+    return part, runs
+
+
+def remapPart(args):
+    """
+        Renumérote les stems d'une tranche dans un processus de travail
+
+        :param args: Index de la tranche, ordinal global de chacun de ses stems
+        :type args: tuple
+        :return: Positions et tailles des enregistrements réécrits, et
+                 positions de leurs positions
+        :rtype: tuple
+    """
+
+    part, mapping = args
+    part.remapStems(dict(zip(part.stemIds, mapping)))
+    return part.docOffsets, part.docSizes, part.posOffsets
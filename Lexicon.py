@@ -0,0 +1,281 @@
+# coding: utf-8
+
+"""
+    Lexique trié, compressé par blocs, interrogé directement sur disque
+
+    Les stems sont triés et regroupés par blocs de taille fixe. Dans un
+    bloc, chaque stem est codé par la longueur du préfixe qu'il partage avec
+    le stem précédent suivie de ses octets restants (front coding) ; le
+    premier stem d'un bloc est écrit en entier. Suivent les valeurs
+    associées aux stems du bloc (ordinal, position et taille de la liste de
+    postings, nombre de documents, tf maximal et nombre d'occurrences),
+    rangées en colonnes dont chacune utilise la plus petite largeur (1, 2, 4
+    ou 8 octets) capable de contenir sa plus grande valeur, comme dans
+    codec : elles sont décodées en C par array.frombytes().
+
+    Seul l'index des blocs (premier stem et position de chaque bloc) est
+    chargé en mémoire : une recherche est une dichotomie sur cet index
+    suivie du décodage d'un seul bloc.
+
+    Format du fichier : les blocs, l'index des blocs, puis un pied de page
+    (position de l'index, nombre de stems, taille des blocs).
+"""
+
+import os
+import sys
+import mmap
+import struct
+import itertools
+from array import array
+from bisect import bisect_left, bisect_right
+import Cache
+
+_entry = struct.Struct("<BH")
+_head = struct.Struct("<HH")
+_block = struct.Struct("<QH")
+_footer = struct.Struct("<QII")
+_types = "BHIQ"
+_columns = 6
+
+
+def code(m):
+    """
+        Retourne le code de la plus petite largeur capable de contenir m
+
+        :param m: Plus grande valeur à stocker
+        :type m: int
+        :return: Code de largeur (0 à 3)
+        :rtype: int
+    """
+
+    return 0 if m < 1 << 8 else 1 if m < 1 << 16 else 2 if m < 1 << 32 else 3
+
+
+def writeBlock(entries):
+    """
+        Encode un bloc du lexique
+
+        :param entries: Couples (stem, valeurs) du bloc, triés par stem
+        :type entries: list
+        :rtype: bytes
+    """
+
+    stems = []
+    previous = b""
+    for stem, values in entries:
+        s = stem.encode()
+        p = min(len(os.path.commonprefix([previous, s])), 255)
+        stems.append(_entry.pack(p, len(s) - p) + s[p:])
+        previous = s
+
+    columns = list(zip(*(values for stem, values in entries)))
+    codes = [code(max(c)) for c in columns]
+    packed = []
+    for c, values in zip(codes, columns):
+        a = array(_types[c], values)
+        if sys.byteorder == "big":
+            a.byteswap()
+        packed.append(a.tobytes())
+    return _head.pack(len(entries), sum(c << 2 * i for i, c in enumerate(codes))) + b"".join(stems) + b"".join(packed)
+
+
+def write(path, entries, blockSize=16):
+    """
+        Écrit un lexique
+
+        :param path: Fichier à écrire
+        :param entries: Couples (stem, valeurs) triés par stem ; les valeurs
+                        sont (ordinal, position, taille, df, tf maximal, cf)
+        :param blockSize: Nombre de stems par bloc
+        :type path: str
+        :type entries: iterable
+        :type blockSize: int
+    """
+
+    index = []
+    with open(path, "wb") as f:
+        offset = 0
+        n = 0
+        entries = iter(entries)
+        while True:
+            block = list(itertools.islice(entries, blockSize))
+            if not block:
+                break
+            first = block[0][0].encode()
+            index.append(_block.pack(offset, len(first)) + first)
+            b = writeBlock(block)
+            f.write(b)
+            offset += len(b)
+            n += len(block)
+        f.write(b"".join(index))
+        f.write(_footer.pack(offset, n, blockSize))
+
+
+def sizeofBlock(block):
+    """
+        Retourne la taille en mémoire d'un bloc décodé
+
+        :param block: Couples (stem, valeurs)
+        :type block: list
+        :rtype: int
+    """
+
+    return sys.getsizeof(block) + sum(sys.getsizeof(e) + sys.getsizeof(e[0]) + sys.getsizeof(e[1])
+                                      + sum(map(sys.getsizeof, e[1])) for e in block)
+
+
+class Lexicon(object):
+    """
+        Lexicon
+
+        Lexique écrit par write(), ouvert en ne lisant que l'index de ses
+        blocs. Les blocs décodés sont conservés dans un cache LRU.
+    """
+
+    def __init__(self, path, cache=1 << 20):
+        """
+            Ouvre un lexique
+
+            :param path: Fichier du lexique
+            :param cache: Mémoire allouée aux blocs décodés, en octets
+            :type path: str
+            :type cache: int
+        """
+
+        self.path = path
+        self.view = None
+        self.blocks = Cache.LRUCache(cache, sizeofBlock)
+
+        with open(path, "rb") as f:
+            end = f.seek(-_footer.size, os.SEEK_END)
+            indexOffset, self.size, self.blockSize = _footer.unpack(f.read(_footer.size))
+            f.seek(indexOffset)
+            b = f.read(end - indexOffset)
+
+        self.firsts = []
+        self.offsets = array("Q")
+        p = 0
+        while p < len(b):
+            offset, l = _block.unpack_from(b, p)
+            p += _block.size
+            self.firsts.append(b[p:p + l].decode())
+            self.offsets.append(offset)
+            p += l
+        self.offsets.append(indexOffset)
+
+    def __getstate__(self):
+        # La projection mémoire n'est pas transmise aux processus de travail
+        state = self.__dict__.copy()
+        state["view"] = None
+        return state
+
+    def __len__(self):
+        return self.size
+
+    def map(self):
+        """
+            Projette le fichier du lexique en mémoire
+        """
+
+        self.close()
+        with open(self.path, "rb") as f:
+            self.view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def close(self):
+        """
+            Libère la projection créée par map()
+        """
+
+        if self.view is not None:
+            m = self.view.obj
+            self.view.release()
+            m.close()
+            self.view = None
+
+    def block(self, k):
+        """
+            Retourne un bloc décodé
+
+            :param k: Numéro du bloc
+            :type k: int
+            :return: Couples (stem, valeurs) du bloc, triés par stem
+            :rtype: list
+        """
+
+        block = self.blocks.get(k)
+        if block is not None:
+            return block
+
+        offset, end = self.offsets[k], self.offsets[k + 1]
+        if self.view is not None:
+            b = self.view[offset:end]
+        else:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                b = f.read(end - offset)
+
+        n, codes = _head.unpack_from(b)
+        p = _head.size
+        stems = []
+        previous = b""
+        for _ in range(n):
+            shared, l = _entry.unpack_from(b, p)
+            p += _entry.size
+            s = previous[:shared] + bytes(b[p:p + l])
+            p += l
+            stems.append(s.decode())
+            previous = s
+
+        columns = []
+        for i in range(_columns):
+            a = array(_types[codes >> 2 * i & 3])
+            a.frombytes(b[p:p + n * a.itemsize])
+            if sys.byteorder == "big":
+                a.byteswap()
+            p += n * a.itemsize
+            columns.append(a)
+
+        block = list(zip(stems, zip(*columns)))
+        self.blocks.put(k, block)
+        return block
+
+    def find(self, stem):
+        """
+            Retourne les valeurs associées à un stem (None s'il est absent)
+
+            :param stem: Stem recherché
+            :type stem: str
+            :return: Ordinal, position et taille de la liste de postings,
+                     df, tf maximal et cf
+            :rtype: tuple
+        """
+
+        k = bisect_right(self.firsts, stem) - 1
+        if k < 0:
+            return None
+        block = self.block(k)
+        p = bisect_left(block, stem, key=lambda e: e[0])
+        if p < len(block) and block[p][0] == stem:
+            return block[p][1]
+        return None
+
+    def prefix(self, prefix):
+        """
+            Génère les stems commençant par un préfixe, dans l'ordre
+
+            :param prefix: Préfixe recherché
+            :type prefix: str
+            :return: Générateur de couples (stem, valeurs)
+            :rtype: generator
+        """
+
+        for k in range(max(0, bisect_left(self.firsts, prefix) - 1), len(self.firsts)):
+            for stem, values in self.block(k):
+                if stem.startswith(prefix):
+                    yield stem, values
+                elif stem > prefix:
+                    return
+
+    def __iter__(self):
+        for k in range(len(self.firsts)):
+            yield from self.block(k)
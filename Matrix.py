@@ -0,0 +1,147 @@
+# coding: utf-8
+
+import time
+import logging
+
+try:
+    import numpy as np
+    import scipy.sparse as sp
+except ImportError:
+    np = sp = None
+
+log = logging.getLogger(__name__)
+
+
+
+class Matrix(object):
+    """
+        Matrix
+
+        Matrice creuse termes-documents d'un modèle additif (nécessite numpy
+        et scipy).
+
+        La ligne d'un terme contient sa contribution, pour un poids de 1
+        dans la requête, au score de chaque document, telle que retournée
+        par model.getTermScores(). Comme cette contribution est linéaire
+        en le poids du terme (Vectoriel, Okapi), le score d'une requête est
+        un produit matrice-vecteur, et celui d'un lot de requêtes un seul
+        produit matrice-matrice.
+
+        Les contributions sont stockées en float32 (ordinaux en int32) :
+        les scores sont identiques à ceux de IRmodel.getRanking() pour des
+        poids entiers (tf), à la précision du float32 près sinon. Les
+        documents de score nul ne sont pas retournés.
+    """
+
+    def __init__(self, model):
+        """
+            Construit la matrice à partir des listes de postings de l'index
+
+            :param model: Modèle additif à vectoriser
+            :type  model: IRmodel
+        """
+
+        if sp is None:
+            raise ImportError("Matrix nécessite numpy et scipy")
+
+        log_start = time.time()
+
+        self.model = model
+        self.index = model.index
+        self.rows = {stem: i for i, stem in enumerate(self.index.stemIds)}
+
+        indptr = np.zeros(len(self.rows) + 1, dtype=np.int64)
+        indices = []
+        data = []
+        for i, stem in enumerate(self.index.stemIds):
+            ords, scores = model.getTermScores(stem, 1)
+            indices.append(np.asarray(ords, dtype=np.int32))
+            data.append(np.asarray(scores, dtype=np.float32))
+            indptr[i + 1] = indptr[i] + len(ords)
+
+        self.matrix = sp.csr_matrix((np.concatenate(data) if data else np.zeros(0, np.float32),
+                                     np.concatenate(indices) if indices else np.zeros(0, np.int32),
+                                     indptr),
+                                    shape=(len(self.rows), len(self.index.docIds)))
+
+        log.debug("Matrice " + str(self.matrix.shape) + " construite en "
+                  + str(time.time() - log_start) + " secondes.\n")
+
+
+    def getQueryMatrix(self, queries):
+        """
+            Retourne la matrice creuse des poids d'un lot de requêtes
+
+            Les termes absents de l'index sont ignorés.
+
+            :param queries: Requêtes à traiter
+            :type  queries: list
+            :return: Matrice requêtes-termes
+            :rtype: scipy.sparse.csr_matrix
+        """
+        indptr = [0]
+        indices = []
+        data = []
+        for query in queries:
+            for stem, weight in self.model.weighter.getWeightsForQuery(query).items():
+                if stem in self.rows:
+                    indices.append(self.rows[stem])
+                    data.append(weight)
+            indptr.append(len(indices))
+
+        return sp.csr_matrix((np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32), indptr),
+                             shape=(len(queries), len(self.rows)))
+
+
+    def getScores(self, queries):
+        """
+            Retourne les scores des documents pour un lot de requêtes
+
+            :param queries: Requêtes à traiter
+            :type  queries: list
+            :return: Matrice creuse requêtes-documents des scores
+            :rtype: scipy.sparse.csr_matrix
+        """
+        return (self.getQueryMatrix(queries) @ self.matrix).tocsr()
+
+
+    def getRankings(self, queries, k=None):
+        """
+            Retourne les documents classés par score décroissant pour un lot de requêtes
+
+            Même ordre que IRmodel.getRanking() : à score égal, les
+            documents sont classés par ordinal croissant.
+
+            :param queries: Requêtes à traiter
+            :param k: Nombre de documents à retourner par requête (tous par défaut)
+            :type  queries: list
+            :type  k: int
+            :return: Pour chaque requête, couples (document, score)
+            :rtype: list
+        """
+        scores = self.getScores(queries)
+        docIds = self.index.docIds
+
+        rankings = []
+        for q in range(scores.shape[0]):
+            a, b = scores.indptr[q], scores.indptr[q + 1]
+            ords = scores.indices[a:b]
+            values = scores.data[a:b]
+            order = np.lexsort((ords, -values))[:k]
+            rankings.append([(docIds[o], float(v)) for o, v in zip(ords[order], values[order])])
+
+        return rankings
+
+
+    def getRanking(self, query, k=None):
+        """
+            Retourne les documents classés par score décroissant
+
+            :param query: Requête à traiter
+            :param k: Nombre de documents à retourner (tous par défaut)
+            :type  query: str
+            :type  k: int
+            :return: Couples (document, score)
+            :rtype: list
+        """
+        return self.getRankings([query], k)[0]
@@ -4,6 +4,7 @@ Created on 6 sept. 2016
 @author: SL
 '''
 import os
+import mmap
 from Document import Document
 class Parser(object):
     '''
@@ -15,13 +16,33 @@ class Parser(object):
         '''
         Constructor
         '''
+        if(isinstance(begin,str)):
+            begin=begin.encode()
+        if(isinstance(end,str)):
+            end=end.encode()
         self.begin=begin
         self.end=end
         self.file=None
+        self.stop=None
 
 
-    def initFile(self,filename):
+    def initFile(self,filename,start=0,stop=None):
+        """
+            Ouvre le fichier à parser
+
+            :param filename: Fichier à parser
+            :param start: Position du premier document à lire
+            :param stop: Position à laquelle arrêter la lecture (fin du fichier par défaut)
+        """
         self.file=open(filename,"rb")
+        self.file.seek(start)
+        self.stop=stop
+
+    def __getstate__(self):
+        # Le fichier ouvert n'est pas transmis aux processus de travail
+        state=self.__dict__.copy()
+        state["file"]=None
+        return state
 
 
     def __del__(self):
@@ -37,14 +58,17 @@ class Parser(object):
         ligne=""
         ok=False;
         while(not ok):
-            st=""
+            st=[]
             read=False;
             start=0;
             nbBytes=0;
             while(True):
                 curOff=self.file.tell();
 
-                ligne=self.file.readline();
+                if((self.stop is not None) and (curOff>=self.stop)):
+                    ligne=b""
+                else:
+                    ligne=self.file.readline();
                 #self.file.seek(curOff,0)
                 #print ligne
 
@@ -69,7 +93,7 @@ class Parser(object):
                         read=True
                         start=curOff
                 if(read):
-                    st+=(ligne.decode())
+                    st.append(ligne)
                 if((len(self.end)>0) and (ligne.startswith(self.end))):
                     read=False
                     ok=True;
@@ -78,7 +102,7 @@ class Parser(object):
             if (ok):
                 source=os.path.abspath(self.file.name)+";"+str(start)+";"+str(nbBytes)
                 #print source
-                d=self.getDocument(st);
+                d=self.getDocument(b"".join(st).decode());
                 d.set("from", source);
             else:
                 self.file.close();
@@ -94,9 +118,88 @@ class Parser(object):
         """
             Retourne le nombre de documents à parser
         """
-        lines = self.file.readlines()
-        self.file.seek(0)
-        return len([1 for row in lines if row.startswith(self.begin)])
+        return len(self.documentOffsets())
+
+    def documentOffsets(self):
+        """
+            Retourne la position de début de chaque document à parser
+        """
+        mm=self.map()
+        if(mm is None):
+            return []
+        with mm:
+            return [start for start,end in self.boundaries(mm)]
+
+    def iterDocuments(self):
+        """
+            Génère les documents à parser
+
+            Alternative à nextDocument() : le fichier est projeté en mémoire
+            et les documents sont délimités par recherche de leurs marqueurs,
+            sans lecture ligne à ligne. La mémoire utilisée ne dépend pas de
+            la taille du corpus.
+        """
+        mm=self.map()
+        if(mm is None):
+            return
+        source=os.path.abspath(self.file.name)
+        with mm:
+            for start,end in self.boundaries(mm):
+                d=self.getDocument(mm[start:end].decode())
+                d.set("from",source+";"+str(start)+";"+str(end-start))
+                yield d
+
+    def map(self):
+        """
+            Projette le fichier à parser en mémoire (None s'il est vide)
+        """
+        if(os.fstat(self.file.fileno()).st_size==0):
+            return None
+        return mmap.mmap(self.file.fileno(),0,access=mmap.ACCESS_READ)
+
+    def boundaries(self,mm):
+        """
+            Génère les positions (début, fin) des documents à parser
+
+            Un document commence à une ligne débutant par self.begin et se
+            termine à la ligne débutant par self.end, ou à défaut au début du
+            document suivant, entre la position courante du fichier et
+            self.stop.
+        """
+        pos=self.file.tell()
+        stop=len(mm) if self.stop is None else min(self.stop,len(mm))
+        begin=b"\n"+self.begin
+        end=b"\n"+self.end
+
+        if(mm[pos:pos+len(self.begin)]==self.begin and (pos==0 or mm[pos-1]==10)):
+            start=pos
+        else:
+            start=mm.find(begin,pos,stop)
+            if(start<0):
+                return
+            start+=1
+
+        while(True):
+            if(len(self.end)==0):
+                nxt=mm.find(begin,start,stop)
+                if(nxt<0):
+                    yield start,stop
+                    return
+                yield start,nxt+1
+            else:
+                e=mm.find(end,start,stop)
+                if(e<0):
+                    return
+                last=mm.rfind(begin,start,e)
+                if(last>=0):
+                    start=last+1
+                nxt=mm.find(b"\n",e+1,stop)
+                nxt=stop if nxt<0 else nxt+1
+                yield start,nxt
+                nxt=mm.find(begin,nxt-1,stop)
+                if(nxt<0):
+                    return
+            start=nxt+1
 
 
 
@@ -48,7 +48,7 @@ class ParserCACM(Parser):
         s=""
         for s in st:
             if(s.startswith(".I")):
-                identifier=s[3:]
+                identifier=s[3:].strip()
                 continue
             
             if(s.startswith(".")):
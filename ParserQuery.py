@@ -0,0 +1,75 @@
+# coding: utf-8
+
+from ParserCACM import ParserCACM
+
+
+def normalizeId(identifier):
+    """
+        Normalise un identifiant de document ou de requête
+
+        Les blancs (dont le retour chariot des fichiers CRLF, comme ceux de
+        CISI) sont retirés et un identifiant numérique perd ses zéros de
+        tête : "01\r" et "1" désignent le même document.
+
+        :param identifier: Identifiant lu
+        :type  identifier: str
+        :rtype: str
+    """
+
+    identifier = identifier.strip()
+    return str(int(identifier)) if identifier.isdigit() else identifier
+
+
+class ParserQuery(ParserCACM):
+    """
+        ParserQuery
+
+        Parseur des fichiers de requêtes (cacm.qry, cisi.qry), au format
+        .I/.W de ParserCACM. Chaque requête lue porte la liste des
+        identifiants de ses documents pertinents, lus dans le fichier de
+        jugements associé (cacm.rel, cisi.rel), sous la clé "relevants".
+
+        Sous la clé "fielded", le texte de la requête est réécrit pour un
+        index à champs : les auteurs cités (section .A) ne sont cherchés que
+        dans le champ "author" (voir Weighter.getQueryRepresentation()).
+    """
+
+    def __init__(self, relFile=None):
+        """
+            Initialise un objet ParserQuery
+
+            :param relFile: Fichier des jugements de pertinence
+            :type  relFile: str
+        """
+
+        ParserCACM.__init__(self)
+        self.relevants = {}
+        if relFile is not None:
+            self.readRelevants(relFile)
+
+    def readRelevants(self, relFile):
+        """
+            Lit un fichier de jugements de pertinence
+
+            Chaque ligne contient l'identifiant de la requête puis celui d'un
+            document pertinent ; les colonnes suivantes sont ignorées. Les
+            identifiants sont normalisés (voir normalizeId()).
+
+            :param relFile: Fichier des jugements de pertinence
+            :type  relFile: str
+        """
+
+        with open(relFile) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2:
+                    self.relevants.setdefault(normalizeId(fields[0]), []).append(normalizeId(fields[1]))
+
+    def getDocument(self, text):
+        doc = ParserCACM.getDocument(self, text)
+        doc.set("relevants", self.relevants.get(normalizeId(doc.getId()), []))
+        text = " \n ".join((doc.get("title"), doc.get("keywords"), doc.get("text")))
+        if doc.get("author").strip():
+            text += " \n author:(" + doc.get("author").replace(")", " ") + ")"
+        doc.set("fielded", text)
+        return doc
@@ -0,0 +1,141 @@
+# coding: utf-8
+
+"""
+    Expressions et proximité dans les requêtes
+
+    Une expression entre guillemets ("time sharing") n'est retenue que si
+    ses stems apparaissent dans le document aux mêmes distances relatives
+    que dans la requête ; suivie de ~n ("time sharing"~5), ses stems doivent
+    apparaître, dans un ordre quelconque, dans une fenêtre de n mots. Les
+    positions comptent les mots vides, qui séparent donc les stems d'une
+    expression comme dans le texte (voir TextRepresenter.getTextPositions()).
+
+    Les positions ne sont lues que pour les documents contenant déjà tous
+    les stems de l'expression (voir IRmodel.getRankingPhrases()).
+"""
+
+import re
+
+# Expression entre guillemets, éventuellement suivie d'une taille de fenêtre
+pattern = re.compile(r'"([^"]*)"(?:~(\d+))?')
+
+
+class Phrase(object):
+    """
+        Phrase
+
+        Expression d'une requête : stems et position de chacun de leurs
+        mots relativement au premier, ou taille de la fenêtre qui doit les
+        contenir.
+    """
+
+    def __init__(self, positions, window=None):
+        """
+            Initialise un objet Phrase
+
+            :param positions: Positions des stems dans l'expression (voir
+                              TextRepresenter.getTextPositions())
+            :param window: Taille de la fenêtre, en mots (expression exacte par défaut)
+            :type positions: dict
+            :type window: int
+        """
+
+        self.terms = sorted((p, s) for s, ps in positions.items() for p in ps)
+        self.stems = set(positions)
+        self.window = window
+        self.key = (tuple(self.terms), window)
+
+    def __eq__(self, other):
+        return isinstance(other, Phrase) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return "Phrase(" + repr(self.terms) + ", " + repr(self.window) + ")"
+
+    def match(self, positions):
+        """
+            Indique si l'expression apparaît dans un document
+
+            :param positions: Positions croissantes des stems de l'expression
+                              dans le document
+            :type positions: dict
+            :rtype: bool
+        """
+
+        if any(s not in positions for s in self.stems):
+            return False
+        if self.window is None:
+            return self.matchExact(positions)
+        return self.matchWindow(positions)
+
+    def matchExact(self, positions):
+        """
+            Indique si les stems apparaissent aux mêmes distances relatives que dans l'expression
+
+            Chaque mot de l'expression propose les débuts d'occurrence
+            compatibles avec ses positions dans le document ; l'expression
+            apparaît si un début est commun à tous ses mots. Les mots sont
+            pris du plus rare au plus fréquent dans le document.
+
+            :param positions: Positions des stems dans le document
+            :type positions: dict
+            :rtype: bool
+        """
+
+        terms = sorted(self.terms, key=lambda t: len(positions[t[1]]))
+        o, s = terms[0]
+        starts = {p - o for p in positions[s]}
+        for o, s in terms[1:]:
+            starts.intersection_update([p - o for p in positions[s]])
+            if not starts:
+                return False
+        return bool(starts)
+
+    def matchWindow(self, positions):
+        """
+            Indique si tous les stems apparaissent dans une fenêtre de Phrase.window mots
+
+            Les occurrences des stems sont parcourues dans l'ordre du
+            document ; la plus petite fenêtre contenant tous les stems et
+            finissant à chaque occurrence est maintenue par deux indices.
+
+            :param positions: Positions des stems dans le document
+            :type positions: dict
+            :rtype: bool
+        """
+
+        occurrences = sorted((p, s) for s in self.stems for p in positions[s])
+        counts = {}
+        first = 0
+        for p, s in occurrences:
+            counts[s] = counts.get(s, 0) + 1
+            while counts[occurrences[first][1]] > 1:
+                counts[occurrences[first][1]] -= 1
+                first += 1
+            if len(counts) == len(self.stems) and p - occurrences[first][0] < self.window:
+                return True
+        return False
+
+
+def parse(query, textRep):
+    """
+        Retourne les expressions d'une requête
+
+        Les mots de l'expression sont analysés par la représentation de
+        l'index ; une expression réduite à des mots vides est ignorée.
+
+        :param query: Requête à traiter
+        :param textRep: Représentation de l'index
+        :type query: str
+        :type textRep: TextRepresenter
+        :rtype: list
+    """
+
+    phrases = []
+    for text, window in pattern.findall(query):
+        positions = textRep.getTextPositions(text)
+        if positions:
+            phrases.append(Phrase(positions, int(window) if window else None))
+    return phrases
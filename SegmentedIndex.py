@@ -0,0 +1,563 @@
+# coding: utf-8
+
+import os
+import json
+import math
+import itertools
+import functools
+import weakref
+import threading
+import multiprocessing
+from array import array
+from bisect import bisect_right
+from Index import Index, analyse
+from IdList import IdList
+
+
+
+class SegmentedIndex(Index):
+    """
+        SegmentedIndex
+
+        Index formé de segments immuables, chacun étant un Index complet
+        (<segment>_index, <segment>_inverted, <segment>_meta). Le fichier
+        <name>_manifest liste les segments vivants, dans l'ordre des
+        documents : l'ordinal global d'un document est son ordinal dans son
+        segment augmenté du nombre de documents des segments précédents.
+
+        Les lectures (getPostings(), getTfsForStem(), statistiques) unissent
+        les segments, de sorte que les modèles l'utilisent comme un Index.
+        Les segments sont construits et fusionnés dans des processus
+        séparés ; une fusion ne bloque pas les lectures. Les segments
+        vivants forment un instantané immuable (voir Snapshot), remplacé
+        d'un bloc à chaque modification : une lecture en cours garde
+        l'instantané qu'elle a pris, et les fichiers d'un segment retiré ne
+        sont supprimés qu'une fois ce segment abandonné par tous les
+        lecteurs.
+
+        Un identifiant ne doit pas apparaître dans deux segments. Un
+        document supprimé est retiré en réécrivant son segment (voir
+        deleteDocuments()).
+    """
+
+    def __init__(self, name, textRepresenter, encoding="text", mergeFactor=4, workers=1):
+        """
+            Ouvre ou crée un index segmenté
+
+            :param name: Nom de l'index
+            :param textRepresenter: Représentation du corpus et des requêtes
+            :param encoding: Format des nouveaux segments, "text" ou "binary"
+            :param mergeFactor: Nombre de segments d'un même palier fusionnés ensemble
+            :param workers: Nombre de processus construisant ou fusionnant les segments
+            :type name: str
+            :type textRepresenter: TextRepresenter
+            :type encoding: str
+            :type mergeFactor: int
+            :type workers: int
+        """
+
+        self.name = name
+        self.parser = None
+        self.textRep = textRepresenter
+        self.source = None
+        self.keep_alive = False
+        self.memory = None
+        self.encoding = encoding
+        self.workers = workers
+        self.mergeFactor = mergeFactor
+        self.delta = {}
+        self.deltaDocs = {}
+        self.deleted = bytearray()
+        self.nbDeleted = 0
+        self.lock = threading.Lock()
+        self.merging = None
+
+        if os.path.exists("./" + name + "_manifest"):
+            with open("./" + name + "_manifest") as mfile:
+                self.manifest = json.load(mfile)
+        else:
+            self.manifest = {"encoding": encoding, "segments": [], "next": 0}
+        self.snapshot = Snapshot([Index.open(s, self.textRep) for s in self.manifest["segments"]])
+
+    def __getstate__(self):
+        state = Index.__getstate__(self)
+        state.pop("lock", None)
+        state.pop("merging", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.merging = None
+
+    def __getattr__(self, key):
+        # Segments et tables agrégées de l'instantané courant
+        if key in Snapshot.keys:
+            return getattr(self.snapshot, key)
+        raise AttributeError(key)
+
+    def map(self):
+        for segment in self.snapshot.segments:
+            segment.map()
+
+    def close(self):
+        for segment in self.snapshot.segments:
+            segment.close()
+
+    def save(self):
+        """
+            Écrit le manifeste de l'index
+
+            Le fichier est remplacé atomiquement : un lecteur voit l'ancienne
+            ou la nouvelle liste de segments, jamais un état intermédiaire.
+        """
+
+        path = "./" + self.name + "_manifest"
+        with open(path + "_tmp", "w") as mfile:
+            json.dump(self.manifest, mfile)
+        os.replace(path + "_tmp", path)
+
+    def newSegmentName(self):
+        """
+            Réserve le nom d'un nouveau segment
+
+            :rtype: str
+        """
+
+        with self.lock:
+            name = self.name + "_seg" + str(self.manifest["next"])
+            self.manifest["next"] += 1
+        return name
+
+    def commit(self, update):
+        """
+            Remplace la liste des segments vivants
+
+            La nouvelle liste est calculée sous le verrou à partir de la
+            liste courante : un segment ajouté pendant une fusion en arrière-
+            plan n'est pas perdu. Le manifeste est écrit, puis un nouvel
+            instantané remplace l'ancien ; seuls les nouveaux segments sont
+            ouverts. Les segments retirés ne sont pas fermés : leurs fichiers
+            sont supprimés quand plus aucune lecture ne les utilise.
+
+            :param update: Fonction retournant les noms des nouveaux segments
+                           vivants à partir de ceux des segments courants
+            :type update: callable
+        """
+
+        with self.lock:
+            segments = update(list(self.manifest["segments"]))
+            current = dict(zip(self.manifest["segments"], self.snapshot.segments))
+            mapped = any(segment.maps for segment in self.snapshot.segments)
+            opened = []
+            for name in segments:
+                segment = current.pop(name, None)
+                if segment is None:
+                    segment = Index.open(name, self.textRep)
+                    if mapped:
+                        segment.map()
+                opened.append(segment)
+            self.manifest["segments"] = segments
+            self.save()
+            self.snapshot = Snapshot(opened)
+            self.version += 1
+
+        for segment in current.values():
+            weakref.finalize(segment, removeSegment, segment.name)
+
+    def build(self, parser, source, nbSegments=None):
+        """
+            Indexe un corpus en plusieurs segments construits en parallèle
+
+            Le corpus est découpé en tranches contiguës de documents ; chaque
+            tranche devient un segment, construit par un processus de travail.
+
+            :param parser: Parseur à utiliser
+            :param source: Corpus à indexer
+            :param nbSegments: Nombre de segments (un par processus par défaut)
+            :type parser: Parser
+            :type source: str
+            :type nbSegments: int
+        """
+
+        parser.initFile(source)
+        offsets = parser.documentOffsets()
+        if not offsets:
+            return
+        step = math.ceil(len(offsets) / (nbSegments or self.workers))
+        bounds = offsets[::step] + [None]
+        tasks = [(self.newSegmentName(), parser, self.textRep, source, a, b, self.encoding)
+                 for a, b in zip(bounds, bounds[1:])]
+
+        if self.workers > 1:
+            with multiprocessing.Pool(self.workers) as pool:
+                pool.map(buildSegment, tasks)
+        else:
+            for task in tasks:
+                buildSegment(task)
+
+        self.commit(lambda names: names + [task[0] for task in tasks])
+        self.maybeMerge()
+
+    def addDocuments(self, documents):
+        """
+            Ajoute des documents à l'index dans un nouveau segment
+
+            :param documents: Documents à ajouter
+            :type documents: list
+        """
+
+        documents = [(d.getId(), (d.others or {}).get("from", ";0;0"), self.textRep.getTextRepresentation(d.getText()))
+                     for d in documents]
+        if not documents:
+            return
+        name = self.newSegmentName()
+        Index(name, None, self.textRep, None, encoding=self.encoding).indexation(documents, len(documents))
+        self.commit(lambda names: names + [name])
+        self.maybeMerge()
+
+    def addDocument(self, doc):
+        self.addDocuments([doc])
+
+    def deleteDocuments(self, docs):
+        """
+            Supprime des documents de l'index
+
+            Les segments étant immuables, chaque segment contenant un des
+            documents est réécrit sans eux, à partir des représentations
+            stockées, puis remplacé dans le manifeste ; un segment vidé est
+            retiré. Une fusion en cours est d'abord attendue.
+
+            :param docs: Identifiants des documents à supprimer
+            :type docs: list
+        """
+
+        if self.merging is not None:
+            self.merging.join()
+            self.merging = None
+
+        docs = set(docs)
+        bySegment = {}
+        for doc in docs:
+            segment = self.getSegment(doc)
+            bySegment.setdefault(segment, []).append(doc)
+
+        replaced = {}
+        for segment, deleted in bySegment.items():
+            old = segment.name
+            if len(deleted) == segment.meta["docs"]:
+                replaced[old] = []
+                continue
+            name = self.newSegmentName()
+            mergeSegments((name, [old], self.encoding, set(deleted)))
+            replaced[old] = [name]
+
+        self.commit(lambda names: [n for name in names for n in replaced.get(name, [name])])
+
+    def deleteDocument(self, doc):
+        self.deleteDocuments([doc])
+
+    def mergePolicy(self):
+        """
+            Choisit les segments à fusionner (politique par paliers)
+
+            Un segment de n documents appartient au palier
+            floor(log(n) / log(mergeFactor)). Dès que mergeFactor segments
+            consécutifs sont dans un même palier, ils sont fusionnés en un
+            segment du palier supérieur : chaque document n'est réécrit
+            qu'un nombre logarithmique de fois.
+
+            :return: Groupes d'indices de segments consécutifs à fusionner
+            :rtype: list
+        """
+
+        tiers = [int(math.log(max(1, s.meta["docs"])) / math.log(self.mergeFactor)) for s in self.snapshot.segments]
+        groups = []
+        k = 0
+        while k + self.mergeFactor <= len(tiers):
+            if len(set(tiers[k:k + self.mergeFactor])) == 1:
+                groups.append(list(range(k, k + self.mergeFactor)))
+                k += self.mergeFactor
+            else:
+                k += 1
+        return groups
+
+    def merge(self, groups):
+        """
+            Fusionne des groupes de segments consécutifs
+
+            Les groupes sont fusionnés en parallèle, chacun dans un nouveau
+            segment ; la liste des segments n'est remplacée qu'à la fin.
+
+            :param groups: Groupes d'indices de segments consécutifs
+            :type groups: list
+        """
+
+        with self.lock:
+            names = list(self.manifest["segments"])
+        tasks = [(self.newSegmentName(), [names[k] for k in group], self.encoding) for group in groups]
+
+        if self.workers > 1 and len(tasks) > 1:
+            with multiprocessing.Pool(min(self.workers, len(tasks))) as pool:
+                pool.map(mergeSegments, tasks)
+        else:
+            for task in tasks:
+                mergeSegments(task)
+
+        # Les segments ajoutés depuis le début de la fusion sont conservés :
+        # seuls les groupes fusionnés sont remplacés
+        def update(current):
+            for name, merged, encoding in tasks:
+                k = current.index(merged[0])
+                current[k:k + len(merged)] = [name]
+            return current
+
+        self.commit(update)
+
+    def maybeMerge(self, background=False):
+        """
+            Fusionne les segments tant que la politique le demande
+
+            :param background: Effectue les fusions dans un fil d'exécution
+                               séparé ; les lectures continuent pendant ce temps
+            :type background: bool
+        """
+
+        def run():
+            groups = self.mergePolicy()
+            while groups:
+                self.merge(groups)
+                groups = self.mergePolicy()
+
+        if self.merging is not None:
+            self.merging.join()
+        if background:
+            self.merging = threading.Thread(target=run)
+            self.merging.start()
+        else:
+            self.merging = None
+            run()
+
+    def getSegment(self, doc, snapshot=None):
+        """
+            Retourne le segment contenant un document
+
+            :param doc: Identifiant du document
+            :param snapshot: Instantané à consulter (le courant par défaut)
+            :type doc: str
+            :type snapshot: Snapshot
+            :rtype: Index
+        """
+
+        snapshot = snapshot or self.snapshot
+        ordinal = snapshot.docIds.find(doc)
+        if ordinal < 0:
+            raise KeyError(doc)
+        return snapshot.segments[bisect_right(snapshot.bases, ordinal) - 1]
+
+    def getDocOrdinal(self, doc):
+        ordinal = self.snapshot.docIds.find(doc)
+        if ordinal < 0:
+            raise KeyError(doc)
+        return ordinal
+
+    def getNbDocs(self):
+        return len(self.snapshot.docLengths)
+
+    def getAvgDocLength(self):
+        snapshot = self.snapshot
+        return snapshot.length / max(1, len(snapshot.docLengths))
+
+    def getStemEntry(self, stem):
+        # Les listes de postings sont dans les segments : position et taille nulles
+        snapshot = self.snapshot
+        k = snapshot.stemIds.find(stem)
+        if k < 0:
+            return None
+        return k, 0, 0, snapshot.stemDfs[k], snapshot.stemMaxTfs[k], snapshot.stemCfs[k]
+
+    def getTfsForDoc(self, doc):
+        return self.getSegment(doc).getTfsForDoc(doc)
+
+    def getTfsForStem(self, stem):
+        tfs = {}
+        for segment in self.snapshot.segments:
+            tfs.update(segment.getTfsForStem(stem))
+        return tfs
+
+    def getPostings(self, stem):
+        snapshot = self.snapshot
+        ords, tfs = array("I"), array("I")
+        for segment, base in zip(snapshot.segments, snapshot.bases):
+            o, t = segment.getPostings(stem)
+            ords.extend(o if base == 0 else array("I", [x + base for x in o]))
+            tfs.extend(array("I", t))
+        return ords, tfs
+
+    def getBlocks(self, stem):
+        # Les blocs de chaque segment, décalés de l'ordinal de son premier document
+        snapshot = self.snapshot
+        blocks = []
+        for segment, base in zip(snapshot.segments, snapshot.bases):
+            for first, last, maxTf, minLength, load in segment.getBlocks(stem):
+                if base:
+                    load = functools.partial(shiftBlock, load, base)
+                blocks.append((first + base, last + base, maxTf, minLength, load))
+        return blocks
+
+    def getStrDoc(self, doc):
+        return self.getSegment(doc).getStrDoc(doc)
+
+
+class Snapshot(object):
+    """
+        Snapshot
+
+        Segments vivants d'un index segmenté à un instant donné, avec
+        l'ordinal du premier document de chacun. Les tables agrégées
+        (stems et documents) sont construites au premier accès, une seule
+        fois même si plusieurs fils d'exécution les demandent ensemble.
+    """
+
+    # Tables agrégées, par section
+    sections = {"lexicon": ("stemIds", "stemDfs", "stemMaxTfs", "stemCfs"),
+                "table": ("docIds", "docLengths", "docNorms", "length")}
+    keys = ("segments", "bases") + sections["lexicon"] + sections["table"]
+
+    def __init__(self, segments):
+        """
+            Initialise un objet Snapshot
+
+            :param segments: Segments ouverts, dans l'ordre des documents
+            :type segments: list
+        """
+
+        self.segments = segments
+        self.bases = [0] + list(itertools.accumulate(s.meta["docs"] for s in segments))
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"segments": self.segments, "bases": self.bases}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __getattr__(self, key):
+        for section, keys in self.sections.items():
+            if key in keys:
+                with self.lock:
+                    # Un autre fil a pu construire la table entre-temps
+                    if key not in self.__dict__:
+                        self.load(section)
+                return self.__dict__[key]
+        raise AttributeError(key)
+
+    def load(self, section):
+        """
+            Agrège une table de l'ensemble des segments
+
+            Les tables sont construites dans des variables locales, puis
+            publiées d'un bloc.
+
+            :param section: Table à agréger, "lexicon" ou "table"
+            :type section: str
+        """
+
+        if section == "lexicon":
+            ordinals = {}
+            stemIds = []
+            dfs, maxTfs, cfs = array("I"), array("I"), array("I")
+            for segment in self.segments:
+                for s, df, maxtf, cf in zip(segment.stemIds, segment.stemDfs, segment.stemMaxTfs, segment.stemCfs):
+                    k = ordinals.get(s)
+                    if k is None:
+                        ordinals[s] = len(stemIds)
+                        stemIds.append(s)
+                        dfs.append(df)
+                        maxTfs.append(maxtf)
+                        cfs.append(cf)
+                    else:
+                        dfs[k] += df
+                        maxTfs[k] = max(maxTfs[k], maxtf)
+                        cfs[k] += cf
+            self.__dict__.update(stemIds=IdList(stemIds), stemDfs=dfs, stemMaxTfs=maxTfs, stemCfs=cfs)
+        else:
+            docIds = []
+            lengths, norms = array("I"), array("d")
+            length = 0
+            for segment in self.segments:
+                docIds.extend(segment.docIds)
+                lengths.extend(segment.docLengths)
+                norms.extend(segment.docNorms)
+                length += segment.length
+            self.__dict__.update(docIds=IdList(docIds), docLengths=lengths, docNorms=norms, length=length)
+
+
+def removeSegment(name):
+    """
+        Supprime les fichiers d'un segment retiré de l'index
+
+        :param name: Nom du segment
+        :type name: str
+    """
+
+    for suffix in ("_index", "_inverted", "_meta", "_lexicon", "_skips"):
+        # Les segments écrits par une version antérieure n'ont pas tous ces fichiers
+        if os.path.exists("./" + name + suffix):
+            os.remove("./" + name + suffix)
+
+
+def shiftBlock(load, base):
+    """
+        Décode un bloc d'un segment et décale ses ordinaux
+
+        :param load: Fonction de décodage du bloc dans le segment
+        :param base: Ordinal du premier document du segment
+        :type load: callable
+        :type base: int
+        :return: Ordinaux et tfs
+        :rtype: tuple(array, array)
+    """
+
+    ords, tfs = load()
+    return array("I", [o + base for o in ords]), tfs
+
+
+def buildSegment(args):
+    """
+        Construit un segment à partir d'une tranche de corpus
+
+        :param args: Nom du segment, parseur, représentation, corpus,
+                     début et fin de la tranche, format
+        :type args: tuple
+    """
+
+    name, parser, textRep, source, start, stop, encoding = args
+    parser.initFile(source, start, stop)
+    count = parser.countDocument()
+    parser.initFile(source, start, stop)
+    Index(name, parser, textRep, source, encoding=encoding).indexation(analyse(parser, textRep), count)
+
+
+def mergeSegments(args):
+    """
+        Fusionne des segments en un nouveau segment
+
+        Les documents sont réindexés à partir de leur représentation
+        stockée, sans nouvelle analyse.
+
+        :param args: Nom du nouveau segment, noms des segments à fusionner,
+                     format et, éventuellement, identifiants des documents
+                     à ne pas reprendre
+        :type args: tuple
+    """
+
+    name, names, encoding, *deleted = args
+    deleted = deleted[0] if deleted else set()
+    segments = [Index.open(n) for n in names]
+    documents = itertools.chain.from_iterable(s.liveDocuments() for s in segments)
+    if deleted:
+        documents = (d for d in documents if d[0] not in deleted)
+    Index(name, None, None, segments[0].source, encoding=encoding).indexation(
+        documents, sum(s.meta["docs"] for s in segments) - len(deleted))
@@ -0,0 +1,317 @@
+# coding: utf-8
+
+"""
+    Serveur de requêtes asyncio
+
+    L'index est ouvert une seule fois, puis interrogé à travers une socket
+    locale (TCP ou Unix). Le protocole est du JSON ligne par ligne :
+
+        {"id": 1, "query": "time sharing system", "k": 10, "timeout": 0.5}
+        -> {"id": 1, "results": [["1410", 12.3], ...], "latency": 1.8}
+
+        {"id": 2, "stats": true}
+        -> {"id": 2, "stats": {"requests": ..., "p50": ..., ...}}
+
+    Les requêtes d'une connexion peuvent être envoyées sans attendre les
+    réponses (pipelining) : chacune est traitée dès sa lecture et sa
+    réponse, identifiée par "id", est écrite dès qu'elle est prête.
+
+    Utilisation : python Server.py Index [--port 8765 | --unix /tmp/ri.sock] [--workers 2 | --threads 4]
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import collections
+import concurrent.futures
+import logging
+import Index
+import IRmodel
+import Evaluation
+import TextRepresenter
+log = logging.getLogger()
+
+
+class Server(object):
+    """
+        Server
+
+        Sert un modèle de recherche d'information sur une socket locale.
+        Le calcul des scores, qui occupe le processeur, est exécuté hors de
+        la boucle d'événements : dans un groupe de processus (le modèle
+        n'est transmis qu'une fois à chacun) ou, à défaut, dans un groupe de
+        fils d'exécution.
+
+        Une requête expirée n'est pas interrompue : son calcul occupe son
+        processus ou son fil jusqu'à la fin. Les autres requêtes sont
+        servies par les processus ou fils restants ; seules workers (ou
+        threads) requêtes lentes simultanées peuvent donc retarder les
+        suivantes.
+    """
+
+    def __init__(self, model, workers=0, timeout=None, window=1000, threads=4, limit=1 << 20):
+        """
+            Initialise un objet Server
+
+            :param model: Modèle à interroger
+            :param workers: Nombre de processus calculant les scores (0 : des fils d'exécution)
+            :param timeout: Délai maximal par défaut d'une requête, en secondes
+            :param window: Nombre de latences récentes conservées pour les centiles
+            :param threads: Nombre de fils d'exécution calculant les scores si workers vaut 0
+            :param limit: Taille maximale d'une ligne de requête, en octets
+            :type model: IRmodel
+            :type workers: int
+            :type timeout: float
+            :type window: int
+            :type threads: int
+            :type limit: int
+        """
+
+        self.model = model
+        self.limit = limit
+        self.timeout = timeout
+        self.workers = workers
+        if workers > 0:
+            self.executor = concurrent.futures.ProcessPoolExecutor(workers, initializer=initWorker, initargs=(model,))
+        else:
+            self.executor = concurrent.futures.ThreadPoolExecutor(threads)
+        self.latencies = collections.deque(maxlen=window)
+        self.counters = {"requests": 0, "errors": 0, "timeouts": 0, "connections": 0}
+        self.started = time.time()
+        self.server = None
+        self.connections = {}
+
+    async def start(self, host="127.0.0.1", port=8765, path=None):
+        """
+            Commence à accepter les connexions
+
+            :param host: Adresse d'écoute TCP
+            :param port: Port d'écoute TCP
+            :param path: Chemin d'une socket Unix, à la place de TCP
+            :type host: str
+            :type port: int
+            :type path: str
+        """
+
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path=path, limit=self.limit)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port, limit=self.limit)
+        log.info("Serveur à l'écoute sur " + str(path or (host + ":" + str(port))) + "\n")
+        return self.server
+
+    async def close(self):
+        """
+            Arrête le serveur et ses processus de travail
+        """
+
+        if self.server is not None:
+            self.server.close()
+            for writer in self.connections:
+                writer.close()
+            await asyncio.gather(*self.connections.values(), return_exceptions=True)
+            await self.server.wait_closed()
+        self.executor.shutdown(cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        """
+            Traite une connexion : une tâche par requête lue
+
+            :param reader: Flux de lecture de la connexion
+            :param writer: Flux d'écriture de la connexion
+            :type reader: asyncio.StreamReader
+            :type writer: asyncio.StreamWriter
+        """
+
+        self.counters["connections"] += 1
+        self.connections[writer] = asyncio.current_task()
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    # Ligne plus longue que self.limit : le reste du flux
+                    # n'est plus découpable, on répond puis on ferme
+                    self.counters["errors"] += 1
+                    response = {"id": None, "error": "requête de plus de " + str(self.limit) + " octets"}
+                    async with lock:
+                        writer.write(json.dumps(response).encode() + b"\n")
+                        await writer.drain()
+                    break
+                if not line:
+                    break
+                task = asyncio.ensure_future(self.answer(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.pop(writer, None)
+            writer.close()
+
+    async def answer(self, line, writer, lock):
+        """
+            Traite une requête et écrit sa réponse
+
+            :param line: Requête JSON
+            :param writer: Flux d'écriture de la connexion
+            :param lock: Verrou sérialisant les écritures de la connexion
+            :type line: bytes
+            :type writer: asyncio.StreamWriter
+            :type lock: asyncio.Lock
+        """
+
+        response = {"id": None}
+        try:
+            request = json.loads(line)
+            response["id"] = request.get("id")
+            if request.get("stats"):
+                response["stats"] = self.stats()
+            else:
+                response["results"], response["latency"] = await self.rank(request["query"], request.get("k", 10),
+                                                                           request.get("timeout", self.timeout))
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            response["error"] = "timeout"
+        except Exception as e:
+            self.counters["errors"] += 1
+            response["error"] = type(e).__name__ + ": " + str(e)
+
+        async with lock:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+
+    async def rank(self, query, k, timeout):
+        """
+            Classe les documents pour une requête, hors de la boucle d'événements
+
+            Au-delà du délai, la réponse n'est plus attendue mais le calcul
+            se poursuit dans son processus ou son fil (voir Server).
+
+            :param query: Requête à traiter
+            :param k: Nombre de documents à retourner
+            :param timeout: Délai maximal, en secondes
+            :type query: str
+            :type k: int
+            :type timeout: float
+            :return: Couples (document, score) et latence en millisecondes
+            :rtype: tuple
+        """
+
+        start = time.perf_counter()
+        if self.workers > 0:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, rankQuery, query, k)
+        else:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, self.model.getRanking, query, k)
+        ranking = await asyncio.wait_for(future, timeout)
+        latency = (time.perf_counter() - start) * 1000
+        self.counters["requests"] += 1
+        self.latencies.append(latency)
+        return ranking, latency
+
+    def stats(self):
+        """
+            Retourne les compteurs du serveur
+
+            :return: Compteurs, débit (requêtes par seconde depuis le
+                     démarrage) et centiles des latences récentes (ms)
+            :rtype: dict
+        """
+
+        stats = dict(self.counters)
+        stats["uptime"] = time.time() - self.started
+        stats["throughput"] = self.counters["requests"] / stats["uptime"]
+        latencies = sorted(self.latencies)
+        for p in (50, 90, 99):
+            stats["p" + str(p)] = Evaluation.percentile(latencies, p)
+        if self.workers == 0 and self.model.cache is not None:
+            stats["cache"] = self.model.cacheInfo()
+        return stats
+
+
+worker = {}
+
+
+def initWorker(model):
+    """
+        Initialise un processus de travail du serveur
+
+        Les fichiers de l'index sont projetés en mémoire une fois pour
+        toutes dans chaque processus.
+
+        :param model: Modèle à interroger
+        :type model: IRmodel
+    """
+
+    model.index.map()
+    worker["model"] = model
+
+
+def rankQuery(query, k):
+    """
+        Classe les documents pour une requête dans un processus de travail
+
+        :param query: Requête à traiter
+        :param k: Nombre de documents à retourner
+        :type query: str
+        :type k: int
+        :rtype: list
+    """
+
+    return worker["model"].getRanking(query, k)
+
+
+async def serve(model, host="127.0.0.1", port=8765, path=None, workers=0, timeout=None, threads=4,
+                limit=1 << 20):
+    """
+        Sert un modèle jusqu'à l'interruption du processus
+
+        :param model: Modèle à interroger
+        :param host: Adresse d'écoute TCP
+        :param port: Port d'écoute TCP
+        :param path: Chemin d'une socket Unix, à la place de TCP
+        :param workers: Nombre de processus calculant les scores
+        :param timeout: Délai maximal par défaut d'une requête, en secondes
+        :param threads: Nombre de fils d'exécution calculant les scores si workers vaut 0
+        :param limit: Taille maximale d'une ligne de requête, en octets
+    """
+
+    server = Server(model, workers, timeout, threads=threads, limit=limit)
+    await server.start(host, port, path)
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Serveur de requêtes")
+    args.add_argument("index", help="nom de l'index à ouvrir")
+    args.add_argument("--model", default="Okapi", choices=["Okapi", "Vectoriel"], help="modèle de recherche")
+    args.add_argument("--host", default="127.0.0.1")
+    args.add_argument("--port", type=int, default=8765)
+    args.add_argument("--unix", help="chemin d'une socket Unix, à la place de TCP")
+    args.add_argument("--workers", type=int, default=0, help="processus calculant les scores (0 : des fils)")
+    args.add_argument("--threads", type=int, default=4, help="fils calculant les scores si --workers vaut 0")
+    args.add_argument("--timeout", type=float, help="délai maximal par défaut d'une requête, en secondes")
+    args.add_argument("--cache", type=int, help="mémoire du cache des résultats, en octets (par processus)")
+    args.add_argument("--limit", type=int, default=1 << 20, help="taille maximale d'une requête, en octets")
+    args.add_argument("--ttl", type=float, help="durée de vie d'un résultat en cache, en secondes")
+    args = args.parse_args()
+
+    index = Index.Index.open(args.index, TextRepresenter.PorterStemmer())
+    index.map()
+    model = getattr(IRmodel, args.model)(index)
+    if args.cache:
+        model.setCache(args.cache, args.ttl)
+    try:
+        asyncio.run(serve(model, args.host, args.port, args.unix, args.workers, args.timeout,
+                          args.threads, args.limit))
+    except KeyboardInterrupt:
+        sys.exit(0)
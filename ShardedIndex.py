@@ -0,0 +1,292 @@
+# coding: utf-8
+
+import heapq
+import zlib
+import multiprocessing
+from Index import Index
+import IRmodel
+
+
+def shardOf(doc, nbShards):
+    """
+        Retourne le shard d'un document, par hachage de son identifiant
+
+        crc32 est utilisé plutôt que hash(), dont la valeur change d'un
+        processus à l'autre.
+
+        :param doc: Identifiant du document
+        :param nbShards: Nombre de shards
+        :type doc: str
+        :type nbShards: int
+        :rtype: int
+    """
+    return zlib.crc32(doc.encode()) % nbShards
+
+
+def buildShards(name, parser, textRepresenter, source, nbShards, encoding="text", partition="hash", memory=None):
+    """
+        Indexe un corpus en nbShards index indépendants, en parallèle
+
+        Les documents sont répartis par hachage de leur identifiant
+        (partition="hash") ou par tranches contiguës du corpus
+        (partition="range"). Chaque shard <name>_shard<k> est construit par
+        un processus de travail.
+
+        :param name: Préfixe des shards
+        :param parser: Parseur à utiliser
+        :param textRepresenter: Représentation du corpus
+        :param source: Corpus à indexer
+        :param nbShards: Nombre de shards
+        :param encoding: Format des shards, "text" ou "binary"
+        :param partition: Répartition des documents, "hash" ou "range"
+        :param memory: Mémoire allouée aux postings lors de la construction
+                       de chaque shard, en octets (voir Index)
+        :type name: str
+        :type parser: Parser
+        :type textRepresenter: TextRepresenter
+        :type source: str
+        :type nbShards: int
+        :type encoding: str
+        :type partition: str
+        :type memory: int
+        :return: Noms des shards
+        :rtype: list
+    """
+
+    names = [name + "_shard" + str(k) for k in range(nbShards)]
+    if partition == "range":
+        parser.initFile(source)
+        offsets = parser.documentOffsets()
+        bounds = [offsets[len(offsets) * k // nbShards] if len(offsets) * k // nbShards < len(offsets) else None
+                  for k in range(nbShards)] + [None]
+        ranges = list(zip(bounds, bounds[1:]))
+    else:
+        ranges = [(0, None)] * nbShards
+
+    tasks = [(names[k], k, nbShards, partition, parser, textRepresenter, source, a, b, encoding, memory)
+             for k, (a, b) in enumerate(ranges)]
+    with multiprocessing.Pool(min(nbShards, multiprocessing.cpu_count())) as pool:
+        pool.map(buildShard, tasks)
+    return names
+
+
+def buildShard(args):
+    """
+        Construit un shard dans un processus de travail
+
+        Les documents sont analysés au fil de la lecture, sans être gardés
+        en mémoire. Leur nombre, qui ne sert qu'à la progression, est
+        compté sur les positions des documents ; avec la répartition par
+        hachage, il est estimé à la part du shard dans le corpus.
+
+        :param args: Nom et numéro du shard, nombre de shards, répartition,
+                     parseur, représentation, corpus, tranche, format, budget mémoire
+        :type args: tuple
+    """
+
+    name, k, nbShards, partition, parser, textRep, source, start, stop, encoding, memory = args
+    if partition == "range" and start is None:
+        documents, count = [], 0
+    else:
+        parser.initFile(source, start or 0, stop)
+        count = parser.countDocument()
+        if partition == "hash":
+            count = -(-count // nbShards)
+        parser.initFile(source, start or 0, stop)
+        documents = (d for d in parser.iterDocuments() if partition == "range" or shardOf(d.getId(), nbShards) == k)
+    triplets = ((d.getId(), d.get("from"), textRep.getTextRepresentation(d.getText())) for d in documents)
+    Index(name, parser, textRep, source, encoding=encoding, memory=memory).indexation(triplets, count)
+
+
+class Shard(Index):
+    """
+        Shard
+
+        Index d'une partie du corpus dont les statistiques de collection
+        (nombre de documents, longueur moyenne, df, cf, tf maximal) sont
+        celles de l'ensemble des shards, fournies par le coordinateur : un
+        modèle y calcule les mêmes scores que sur un index unique.
+    """
+
+    globalStats = None
+
+    def getNbDocs(self):
+        if self.globalStats is None:
+            return Index.getNbDocs(self)
+        return self.globalStats["docs"]
+
+    def getAvgDocLength(self):
+        if self.globalStats is None:
+            return Index.getAvgDocLength(self)
+        return self.globalStats["length"] / max(1, self.globalStats["docs"])
+
+    def getDf(self, stem):
+        if self.globalStats is None:
+            return Index.getDf(self, stem)
+        return self.globalStats["stems"].get(stem, (0, 0, 0))[0]
+
+    def getMaxTf(self, stem):
+        if self.globalStats is None:
+            return Index.getMaxTf(self, stem)
+        return self.globalStats["stems"].get(stem, (0, 0, 0))[1]
+
+    def getCf(self, stem):
+        if self.globalStats is None:
+            return Index.getCf(self, stem)
+        return self.globalStats["stems"].get(stem, (0, 0, 0))[2]
+
+
+def serveShard(conn, name, textRep, model, weighter, options):
+    """
+        Sert un shard dans un processus dédié
+
+        Messages reçus par le tube : ("stats",) retourne les statistiques
+        locales, ("global", stats) installe les statistiques globales,
+        ("rank", requête, k) retourne le classement local, None termine.
+
+        :param conn: Extrémité du tube vers le coordinateur
+        :param name: Nom du shard
+        :param textRep: Représentation des requêtes
+        :param model: Classe du modèle
+        :param weighter: Classe de la pondération
+        :param options: Paramètres supplémentaires du modèle
+        :type conn: multiprocessing.connection.Connection
+        :type name: str
+        :type textRep: TextRepresenter
+        :type model: type
+        :type weighter: type
+        :type options: dict
+    """
+
+    index = Shard.open(name, textRep)
+    index.map()
+    irmodel = model(index, weighter(index) if weighter else None, **options)
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        if message[0] == "stats":
+            stems = zip(index.stemIds, zip(index.stemDfs, index.stemMaxTfs, index.stemCfs))
+            conn.send({"docs": index.getNbDocs(), "length": index.length, "stems": dict(stems)})
+        elif message[0] == "global":
+            index.globalStats = message[1]
+        else:
+            try:
+                conn.send(irmodel.getRanking(message[1], message[2]))
+            except Exception as e:
+                conn.send(e)
+
+    index.close()
+    conn.close()
+
+
+
+class ShardedIndex(object):
+    """
+        ShardedIndex
+
+        Coordinateur d'un index réparti : chaque shard est servi par son
+        propre processus, relié par un tube. Une requête est envoyée à tous
+        les shards (scatter), qui la traitent en parallèle ; les k meilleurs
+        documents de chaque shard sont ensuite fusionnés (gather).
+
+        Au démarrage, les statistiques de tous les shards sont agrégées puis
+        renvoyées à chacun, de sorte que l'idf et la longueur moyenne soient
+        les mêmes partout.
+    """
+
+    def __init__(self, names, textRepresenter, model=IRmodel.Okapi, weighter=None, **options):
+        """
+            Démarre un processus par shard
+
+            :param names: Noms des shards (voir buildShards())
+            :param textRepresenter: Représentation des requêtes
+            :param model: Classe du modèle utilisé par chaque shard
+            :param weighter: Classe de la pondération (celle du modèle par défaut)
+            :param options: Paramètres supplémentaires du modèle
+            :type names: list
+            :type textRepresenter: TextRepresenter
+            :type model: type
+            :type weighter: type
+        """
+
+        self.names = names
+        self.conns = []
+        self.processes = []
+        for name in names:
+            conn, child = multiprocessing.Pipe()
+            p = multiprocessing.Process(target=serveShard, args=(child, name, textRepresenter, model, weighter, options),
+                                        daemon=True)
+            p.start()
+            child.close()
+            self.conns.append(conn)
+            self.processes.append(p)
+
+        stats = self.scatter(("stats",))
+        self.globalStats = {"docs": sum(s["docs"] for s in stats), "length": sum(s["length"] for s in stats), "stems": {}}
+        for s in stats:
+            for stem, (df, maxtf, cf) in s["stems"].items():
+                d, m, c = self.globalStats["stems"].get(stem, (0, 0, 0))
+                self.globalStats["stems"][stem] = (d + df, max(m, maxtf), c + cf)
+        for conn in self.conns:
+            conn.send(("global", self.globalStats))
+
+    def scatter(self, message):
+        """
+            Envoie un message à tous les shards puis attend leurs réponses
+
+            :param message: Message à envoyer
+            :type message: tuple
+            :return: Réponse de chaque shard
+            :rtype: list
+        """
+
+        for conn in self.conns:
+            conn.send(message)
+        answers = [conn.recv() for conn in self.conns]
+        for a in answers:
+            if isinstance(a, Exception):
+                raise a
+        return answers
+
+    def getRanking(self, query, k=None):
+        """
+            Retourne les documents classés par score décroissant
+
+            Les scores sont ceux d'un index unique ; à score égal, les
+            documents sont classés par shard puis par ordinal.
+
+            :param query: Requête à traiter
+            :param k: Nombre de documents à retourner (tous par défaut)
+            :type query: str
+            :type k: int
+            :return: Couples (document, score)
+            :rtype: list
+        """
+
+        rankings = self.scatter(("rank", query, k))
+        merged = heapq.merge(*rankings, key=lambda r: -r[1])
+        return list(merged) if k is None else [r for r, _ in zip(merged, range(k))]
+
+    def getScores(self, query):
+        return dict(self.getRanking(query))
+
+    def close(self):
+        """
+            Arrête les processus des shards
+        """
+
+        for conn in self.conns:
+            conn.send(None)
+            conn.close()
+        for p in self.processes:
+            p.join()
+        self.conns = []
+        self.processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
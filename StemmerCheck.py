@@ -0,0 +1,76 @@
+# coding: utf-8
+
+"""
+    Vérification des implémentations du stemmer de Porter
+
+    Chaque implémentation de porter.backends est comparée à porter.stem(),
+    l'implémentation de référence par expressions régulières, sur les mots
+    des fichiers donnés et sur un vocabulaire synthétique (toutes les
+    combinaisons d'une à trois syllabes et d'un suffixe du corpus de
+    Benchmark). Tous les mots sont vérifiés pour chaque implémentation :
+    le programme affiche le nombre de mots identiques et jusqu'à vingt
+    différences par implémentation, puis se termine avec le code 1 si
+    l'une d'elles diffère de la référence.
+
+    Utilisation : python StemmerCheck.py [cacm/cacm.qry cisi/cisi.qry ...]
+"""
+
+import re
+import sys
+import argparse
+import itertools
+import porter
+import Benchmark
+
+
+def vocabulary(paths, length=3):
+    """
+        Retourne les mots à vérifier
+
+        :param paths: Fichiers dont les mots sont repris
+        :param length: Nombre maximal de syllabes des mots synthétiques
+        :type  paths: list
+        :type  length: int
+        :rtype: set
+    """
+
+    words = set()
+    for path in paths:
+        with open(path, encoding="latin-1") as f:
+            words.update(re.findall(r"[a-z]+", f.read().lower()))
+    for k in range(1, length + 1):
+        for syllables in itertools.product(Benchmark._syllables, repeat=k):
+            for suffix in Benchmark._suffixes:
+                words.add("".join(syllables) + suffix)
+    return words
+
+
+def check(words):
+    """
+        Compare chaque implémentation à porter.stem()
+
+        :param words: Mots à vérifier
+        :type  words: iterable
+        :return: Mots mal traités par chaque implémentation, avec le stem
+                 obtenu et le stem attendu
+        :rtype: dict
+    """
+
+    expected = {w: porter.stem(w) for w in words}
+    return {name: [(w, stem(w), s) for w, s in sorted(expected.items()) if stem(w) != s]
+            for name, stem in porter.backends.items()}
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Vérification des implémentations du stemmer de Porter")
+    args.add_argument("paths", nargs="*", default=["cacm/cacm.qry", "cisi/cisi.qry"], help="fichiers de mots")
+    args = args.parse_args()
+
+    words = vocabulary(args.paths)
+    failed = False
+    for name, errors in check(words).items():
+        sys.stdout.write(name + " : " + str(len(words) - len(errors)) + "/" + str(len(words)) + " mots identiques\n")
+        for w, got, s in errors[:20]:
+            sys.stdout.write("  " + w + " : " + got + " au lieu de " + s + "\n")
+        failed = failed or bool(errors)
+    sys.exit(1 if failed else 0)
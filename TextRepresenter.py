@@ -7,7 +7,8 @@ Created on 5 sept. 2016
 '''
 
 import re
-from collections import Counter
+import threading
+from collections import Counter, OrderedDict
 import porter
 
 
@@ -25,21 +26,77 @@ class TextRepresenter(object):
     def getTextRepresentation(self,text):
         raise NotImplementedError
 
+    def getTextPositions(self,text):
+        raise NotImplementedError
+
 
 
 class PorterStemmer(TextRepresenter):
 
-    def __init__(self):
+    def __init__(self,cacheSize=100000,backend="fast"):
         '''
         Constructor
+
+        :param cacheSize: Nombre maximal de mots gards dans le cache de racinisation (0 pour le dsactiver)
+        :param backend: Implmentation de porter  utiliser, "fast" ou "regex" (voir porter.backends)
         '''
         self.stopWords=set()
         self._setStopWords()
+        self.backend=porter.backends[backend]
+        self.cacheSize=cacheSize
+        self.cache=OrderedDict()
+        self.lock=threading.Lock()
+        self.hits=0
+        self.misses=0
+        self.evictions=0
+
+    def __getstate__(self):
+        state=self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.lock=threading.Lock()
+
+    def stem(self,word):
+        '''
+        Racinise un mot en passant par un cache LRU
+
+        Le vocabulaire suivant une loi de Zipf, la plupart des occurrences
+        sont des mots dj vus : ils ne sont raciniss qu'une fois. Le cache
+        est protg par un verrou (Server l'utilise depuis plusieurs fils).
+        '''
+        with self.lock:
+            s=self.cache.get(word)
+            if(s is not None):
+                self.hits+=1
+                self.cache.move_to_end(word)
+                return s
+            self.misses+=1
+        s=self.backend(word)
+        if(self.cacheSize):
+            with self.lock:
+                self.cache[word]=s
+                if(len(self.cache)>self.cacheSize):
+                    self.cache.popitem(last=False)
+                    self.evictions+=1
+        return s
+
+    def cacheInfo(self):
+        '''
+        Retourne les statistiques du cache, sous la forme de Cache.LRUCache.info()
+
+        La taille et le budget sont compts en mots ; les entres n'expirent pas.
+        '''
+        with self.lock:
+            return {"hits":self.hits,"misses":self.misses,"evictions":self.evictions,"expirations":0,
+                    "entries":len(self.cache),"size":len(self.cache),"budget":self.cacheSize}
 
     def getTextRepresentation(self,text):
         tab=re.findall(r"\w+",text,re.UNICODE)
 
-        tab=[porter.stem(word.lower()) for word in tab]
+        tab=[self.stem(word.lower()) for word in tab]
         tab=[word for word in tab if word not in self.stopWords]
 
         ret=Counter(tab)
@@ -47,6 +104,21 @@ class PorterStemmer(TextRepresenter):
         ret={a: b for (a, b) in ret.items()}
         return ret
 
+    def getTextPositions(self,text):
+        '''
+        Retourne les positions des occurrences de chaque stem d'un texte
+
+        La position d'un mot est son rang dans le texte, mots vides compris :
+        deux stems spars par un mot vide ne sont pas contigus. Le nombre
+        de positions d'un stem est son tf dans getTextRepresentation().
+        '''
+        ret={}
+        for i,word in enumerate(re.findall(r"\w+",text,re.UNICODE)):
+            s=self.stem(word.lower())
+            if s not in self.stopWords:
+                ret.setdefault(s,[]).append(i)
+        return ret
+
 
     def _setStopWords(self):
         self.stopWords.add("a");
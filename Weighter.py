@@ -1,5 +1,9 @@
 # coding: utf-8
 
+import re
+import math
+import Phrase
+
 
 class Weighter(object):
     """
@@ -8,6 +12,9 @@ class Weighter(object):
         Pondération des termes d'un corpus pour vectorisation.
     """
 
+    # Longueur minimale d'un mot tronqué ("comput*") développé en stems
+    minPrefix = 3
+
     def __init__(self, index):
         """
             Initialise un objet Weighter
@@ -39,12 +46,158 @@ class Weighter(object):
         return self.index.getTfsForStem(stem)
 
 
+    def getPostingsForStem(self, stem):
+        """
+            Retourne les poids d'un terme donné sous forme de tableaux
+
+            :param stem: Terme à traiter
+            :type  stem: str
+            :return: Ordinaux croissants des documents et poids associés
+            :rtype: tuple(sequence, sequence)
+        """
+        return self.index.getPostings(stem)
+
+
+    def getCursorForStem(self, stem):
+        """
+            Retourne un curseur sur les poids d'un terme donné
+
+            Variante de getPostingsForStem() dont la liste n'est décodée
+            qu'à la demande : le poids du document courant est Cursor.tf.
+
+            :param stem: Terme à traiter
+            :type  stem: str
+            :rtype: Cursor
+        """
+        return self.index.getCursor(stem)
+
+
+    def getMaxWeightForStem(self, stem):
+        """
+            Retourne un majorant des poids d'un terme donné dans les documents
+
+            :param stem: Terme à traiter
+            :type  stem: str
+            :rtype: float
+        """
+        return self.index.getMaxTf(stem)
+
+
+    def getQueryRepresentation(self, query):
+        """
+            Retourne la représentation stem-tf d'une requête
+
+            Un mot tronqué, suivi de "*" (par exemple "comput*"), est
+            remplacé par tous les stems du lexique commençant par ce
+            préfixe, chacun avec le nombre d'occurrences du mot tronqué. Un
+            mot tronqué plus court que Weighter.minPrefix est ignoré.
+
+            Les mots d'une expression entre guillemets (voir getPhrases())
+            sont des termes comme les autres ; la taille de sa fenêtre n'est
+            pas un terme.
+
+            Si l'index a des champs (voir Index.fields), un mot préfixé par
+            le nom d'un champ ("author:pooch"), ou un groupe de mots entre
+            parenthèses ("author:(udo pooch)"), n'est cherché que dans ce
+            champ : ses termes sont les stems du champ ("author.pooch").
+
+            :param query: Requête à traiter
+            :type  query: str
+            :rtype: dict
+        """
+        query = re.sub(r'"~\d+', '"', query)
+        restricted = []
+
+        def restrict(m):
+            if m.group(1) not in self.index.fields:
+                return m.group(0)
+            restricted.append((m.group(2) or m.group(3), m.group(1)))
+            return " "
+
+        if self.index.fields:
+            query = re.sub(r"\b(\w+):(?:\(([^)]*)\)|(\w+\*?))", restrict, query)
+        st = {}
+        for text, field in [(query, None)] + restricted:
+            for stem, tf in self.getTextRepresentation(text, field).items():
+                st[stem] = st.get(stem, 0) + tf
+        return st
+
+
+    def getTextRepresentation(self, text, field=None):
+        """
+            Retourne la représentation stem-tf d'un texte de requête
+
+            .. seealso:: getQueryRepresentation()
+
+            :param text: Texte à traiter, sans expression ni restriction
+            :param field: Champ auquel les termes sont restreints (aucun par défaut)
+            :type  text: str
+            :type  field: str
+            :rtype: dict
+        """
+        st = self.index.textRep.getTextRepresentation(re.sub(r"\w+\*", " ", text))
+        if field is not None:
+            st = {field + "." + s: tf for s, tf in st.items()}
+        for prefix in re.findall(r"(\w+)\*", text):
+            prefix = prefix.lower()
+            if len(prefix) < self.minPrefix:
+                continue
+            # Les stems des champs ne sont pas des développements d'un mot du texte complet
+            for stem in self.index.getStemsWithPrefix(prefix if field is None else field + "." + prefix):
+                if field is not None or "." not in stem:
+                    st[stem] = st.get(stem, 0) + 1
+        return st
+
+
+    def getPhrases(self, query):
+        """
+            Retourne les expressions d'une requête donnée
+
+            Une expression est écrite entre guillemets ("time sharing"),
+            éventuellement suivie de ~n pour une recherche de proximité
+            ("time sharing"~5) : voir Phrase.
+
+            :param query: Requête à traiter
+            :type  query: str
+            :rtype: list
+        """
+        return Phrase.parse(query, self.index.textRep)
+
+
+    def getWeightsForQuery(self, query):
+        """
+            Retourne les poids des termes d'une requête donnée
+
+            Les termes absents de la requête, de poids nul, ne sont pas
+            représentés.
+
+            :param query: Requête à traiter
+            :type  query: str
+            :rtype: dict
+        """
+        return self.getQueryRepresentation(query)
+
+
+
+class WeighterTfIdf(Weighter):
+    """
+        WeighterTfIdf
+
+        Pondération tf-idf : les documents sont pondérés par le tf, les
+        termes de la requête par leur tf multiplié par l'idf.
+    """
+
     def getWeightsForQuery(self, query):
         """
-            Retourne les poids des termes d'une requête donnée pour tous les documents
+            Retourne les poids tf-idf des termes d'une requête donnée
+
+            Les termes absents de l'index sont ignorés.
 
             :param query: Requête à traiter
             :type  query: str
+            :rtype: dict
         """
-        return { **dict.fromkeys(self.index.stems, 0),\
-        **self.index.textRepresenter.getTextRepresentation(query) }
+        n = self.index.getNbDocs()
+        return {s: tf * math.log(n / self.index.getDf(s))
+                for s, tf in self.getQueryRepresentation(query).items()
+                if self.index.getDf(s)}
@@ -0,0 +1,215 @@
+# coding: utf-8
+
+"""
+    Encodage binaire compact des listes de postings
+
+    Une liste de couples (ordinal, tf) triée par ordinal est stockée sous la
+    forme d'un octet d'en-tête suivi de deux tableaux d'entiers : les écarts
+    entre ordinaux successifs, puis les tfs. Chaque tableau utilise la plus
+    petite largeur (1, 2 ou 4 octets) capable de contenir sa plus grande
+    valeur, indiquée dans l'en-tête (4 bits par tableau).
+
+    Ce découpage aligné sur l'octet compresse moins qu'un codage à longueur
+    variable, mais le décodage se fait intégralement en C via
+    array.frombytes() et itertools.accumulate(), sans boucle Python.
+"""
+
+import sys
+from array import array
+from itertools import accumulate
+
+_types = "BHI"
+_sizes = [array(t).itemsize for t in _types]
+
+
+def code(m):
+    """
+        Retourne le code de la plus petite largeur capable de contenir m
+
+        :param m: Plus grande valeur à stocker
+        :type m: int
+        :return: Code de largeur (0, 1 ou 2)
+        :rtype: int
+    """
+
+    return 0 if m < 256 else 1 if m < 65536 else 2
+
+
+def size(n, maxgap, maxtf):
+    """
+        Retourne la taille en octets d'une liste encodée
+
+        :param n: Nombre de postings
+        :param maxgap: Plus grand écart entre ordinaux
+        :param maxtf: Plus grand tf
+        :type n: int
+        :type maxgap: int
+        :type maxtf: int
+        :rtype: int
+    """
+
+    return 1 + n * (_sizes[code(maxgap)] + _sizes[code(maxtf)])
+
+
+def header(maxgap, maxtf):
+    """
+        Retourne l'octet d'en-tête d'une liste
+
+        :param maxgap: Plus grand écart entre ordinaux
+        :param maxtf: Plus grand tf
+        :type maxgap: int
+        :type maxtf: int
+        :rtype: bytes
+    """
+
+    return bytes([code(maxgap) << 4 | code(maxtf)])
+
+
+def pack(values, c):
+    """
+        Encode des entiers avec la largeur de code c
+
+        :param values: Entiers à encoder
+        :param c: Code de largeur
+        :type values: iterable
+        :type c: int
+        :rtype: bytes
+    """
+
+    a = array(_types[c], values)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a.tobytes()
+
+
+def encode(ords, tfs):
+    """
+        Encode une liste de postings
+
+        :param ords: Ordinaux croissants
+        :param tfs: Tfs associés
+        :type ords: sequence
+        :type tfs: sequence
+        :return: Liste encodée
+        :rtype: bytes
+    """
+
+    gaps = [o - p for o, p in zip(ords, [0] + list(ords[:-1]))]
+    g = code(max(gaps, default=0))
+    t = code(max(tfs, default=0))
+    return bytes([g << 4 | t]) + pack(gaps, g) + pack(tfs, t)
+
+
+def decode(b):
+    """
+        Décode une liste de postings
+
+        :param b: Liste encodée par encode()
+        :type b: bytes-like
+        :return: Ordinaux et tfs
+        :rtype: tuple(array, array)
+    """
+
+    gaps = array(_types[b[0] >> 4])
+    tfs = array(_types[b[0] & 15])
+    n = (len(b) - 1) // (gaps.itemsize + tfs.itemsize)
+    gaps.frombytes(b[1:1 + n * gaps.itemsize])
+    tfs.frombytes(b[1 + n * gaps.itemsize:])
+    if sys.byteorder == "big":
+        gaps.byteswap()
+        tfs.byteswap()
+    return array("I", accumulate(gaps)), tfs
+
+
+def widths(h):
+    """
+        Retourne la largeur des écarts et des tfs d'une liste d'après son en-tête
+
+        :param h: Octet d'en-tête de la liste
+        :type h: int
+        :return: Largeurs en octets des écarts et des tfs
+        :rtype: tuple(int, int)
+    """
+
+    return _sizes[h >> 4], _sizes[h & 15]
+
+
+def decodeBlock(h, gaps, tfs, first):
+    """
+        Décode une tranche de postings extraite d'une liste encodée
+
+        Le premier écart de la tranche, relatif au posting qui la précède,
+        est remplacé par l'ordinal du premier document, connu par ailleurs
+        (voir Index.writeSkips()).
+
+        :param h: Octet d'en-tête de la liste
+        :param gaps: Écarts de la tranche
+        :param tfs: Tfs de la tranche
+        :param first: Ordinal du premier document de la tranche
+        :type h: int
+        :type gaps: bytes-like
+        :type tfs: bytes-like
+        :type first: int
+        :return: Ordinaux et tfs
+        :rtype: tuple(array, array)
+    """
+
+    g = array(_types[h >> 4])
+    t = array(_types[h & 15])
+    g.frombytes(gaps)
+    t.frombytes(tfs)
+    if sys.byteorder == "big":
+        g.byteswap()
+        t.byteswap()
+    return array("I", accumulate(g[1:], initial=first)), t
+
+
+def encodePositions(positions):
+    """
+        Encode les positions des stems d'un document
+
+        Les positions croissantes de chaque stem sont remplacées par leurs
+        écarts, la première restant absolue, et les écarts de tous les
+        stems sont rangés à la suite dans un même tableau, précédé d'un
+        octet donnant sa largeur. Le nombre de positions de chaque stem est
+        son tf, connu par ailleurs.
+
+        :param positions: Positions croissantes de chaque stem
+        :type positions: list
+        :return: Positions encodées
+        :rtype: bytes
+    """
+
+    gaps = []
+    for p in positions:
+        gaps.append(p[0])
+        gaps.extend(b - a for a, b in zip(p, p[1:]))
+    c = code(max(gaps, default=0))
+    return bytes([c]) + pack(gaps, c)
+
+
+def decodePositions(b, tfs, wanted=None):
+    """
+        Décode les positions des stems d'un document
+
+        :param b: Positions encodées par encodePositions()
+        :param tfs: Nombre de positions de chaque stem, dans l'ordre de l'encodage
+        :param wanted: Rangs des stems à décoder (tous par défaut)
+        :type b: bytes-like
+        :type tfs: sequence
+        :type wanted: set
+        :return: Couples (rang du stem, positions croissantes)
+        :rtype: list
+    """
+
+    gaps = array(_types[b[0]])
+    gaps.frombytes(b[1:])
+    if sys.byteorder == "big":
+        gaps.byteswap()
+    ret = []
+    i = 0
+    for k, n in enumerate(tfs):
+        if wanted is None or k in wanted:
+            ret.append((k, array("I", accumulate(gaps[i:i + n]))))
+        i += n
+    return ret
@@ -1,4 +1,4 @@
-import TextRepresenter, Index, ParserCACM, pickle
+import TextRepresenter, Index, ParserCACM, ParserQuery, IRmodel, Evaluation
 
 p = ParserCACM.ParserCACM()
 t = TextRepresenter.PorterStemmer()
@@ -6,6 +6,8 @@ i = Index.Index("Index", p, t, "cacm/cacm.txt")
 
 i.indexation()
 
-with open('Index', 'wb') as f:
-    pick = pickle.Pickler(f)
-    pick.dump(i)
\ No newline at end of file
+# L'index est réutilisable par la suite avec Index.Index.open("Index", t)
+
+q = ParserQuery.ParserQuery("cacm/cacm.rel")
+q.initFile("cacm/cacm.qry")
+Evaluation.EvalIRModel(IRmodel.Okapi(i)).evaluate(list(q.iterDocuments()))
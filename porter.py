@@ -172,6 +172,177 @@ def stem(w):
 
     return w
 
+# Regex-free implementation
+
+class _Classes(dict):
+    """Translation table mapping each character to its class in the
+    regular expressions above: "v" for [aeiou], "y" for y (neither a vowel
+    nor a consonant there) and "c" for everything else."""
+
+    def __missing__(self, c):
+        self[c] = "c"
+        return "c"
+
+_classes = _Classes((c, "c") for c in range(0x250))
+_classes.update((ord(c), "v") for c in "aeiou")
+_classes[ord("y")] = "y"
+
+_step4list = frozenset(["al", "ance", "ence", "er", "ic", "able", "ible", "ant", "ement",
+                        "ment", "ent", "ou", "ism", "ate", "iti", "ous", "ive", "ize"])
+
+def _by_ending(suffixes):
+    """Suffixes indexed by their last two letters, longest first."""
+
+    table = {}
+    for s in sorted(suffixes, key=len, reverse=True):
+        table.setdefault(s[-2:], []).append(s)
+    return table
+
+_step2table = _by_ending(_step2list)
+_step3table = _by_ending(_step3list)
+_step4table = _by_ending(_step4list)
+
+def _measure(cls, n):
+    """Measure of the stem made of the n first characters, given the class
+    string of the word: the number of vowel-consonant sequences, counted up
+    to the first "y" (equivalent of _mgr0 for m > 0 and _mgr1 for m > 1)."""
+
+    y = cls.find("y", 0, n)
+    return cls.count("vc", 0, n if y < 0 else y)
+
+def _is_meq1(cls, n):
+    """Equivalent of _meq1.match() on the n first characters."""
+
+    return cls.find("y", 0, n) < 0 and cls.count("vc", 0, n) == 1
+
+def _is_cvc(w, cls, n):
+    """Equivalent of _c_v.match() on the n first characters."""
+
+    return (n >= 3 and w[n - 1] not in "aeiouwxy" and cls[n - 2] != "c"
+            and cls.count("c", 0, n - 2) == n - 2)
+
+def stem_fast(w):
+    """Same output as stem(), without regular expressions: the class of
+    each character is computed once per word (and again only when a suffix
+    is replaced), measure conditions become counts over that class string
+    and suffix rules become table lookups.
+
+    >>> stem_fast("fundamentally")
+    'fundament'
+    """
+
+    if len(w) < 3: return w
+
+    first_is_y = w[0] == "y"
+    if first_is_y:
+        w = "Y" + w[1:]
+
+    # Step 1a
+    if w[-1] == "s":
+        if w.endswith("sses"):
+            w = w[:-2]
+        elif w.endswith("ies"):
+            w = w[:-2]
+        elif w[-2] != "s":
+            w = w[:-1]
+
+    cls = w.translate(_classes)
+
+    # Step 1b
+
+    end = w[-2:]
+    if end == "ed" or end == "ng":
+        if end == "ed" and w[-3:] == "eed":
+            if _measure(cls, len(w) - 3) > 0:
+                w = w[:-1]
+                cls = cls[:-1]
+        else:
+            if end == "ed":
+                n = len(w) - 2
+            elif w[-3:] == "ing":
+                n = len(w) - 3
+            else:
+                n = 0
+            if n > 0 and cls.count("c", 0, n) < n:
+                w = w[:n]
+                cls = cls[:n]
+                if w in ("at", "bl", "iz"):
+                    w += "e"
+                    cls += "v"
+                elif n == 2 and w[0] == w[1] and w[0] not in "aeiouylsz":
+                    w = w[:-1]
+                    cls = cls[:-1]
+                elif _is_cvc(w, cls, n):
+                    w += "e"
+                    cls += "v"
+
+    # Step 1c
+
+    if w[-1] == "y":
+        n = len(w) - 1
+        if cls.count("c", 0, n) < n:
+            w = w[:-1] + "i"
+            cls = cls[:-1] + "v"
+
+    # Step 2
+
+    for suffix in _step2table.get(w[-2:], ()):
+        if len(suffix) < len(w) and w.endswith(suffix):
+            n = len(w) - len(suffix)
+            if _measure(cls, n) > 0:
+                w = w[:n] + _step2list[suffix]
+                cls = w.translate(_classes)
+            break
+
+    # Step 3
+
+    for suffix in _step3table.get(w[-2:], ()):
+        if len(suffix) < len(w) and w.endswith(suffix):
+            n = len(w) - len(suffix)
+            if _measure(cls, n) > 0:
+                w = w[:n] + _step3list[suffix]
+                cls = w.translate(_classes)
+            break
+
+    # Step 4
+
+    end = w[-2:]
+    if end == "on":
+        if len(w) > 4 and (w.endswith("sion") or w.endswith("tion")):
+            n = len(w) - 3
+            if _measure(cls, n) > 1:
+                w = w[:n]
+                cls = cls[:n]
+    else:
+        for suffix in _step4table.get(end, ()):
+            if len(suffix) < len(w) and w.endswith(suffix):
+                n = len(w) - len(suffix)
+                if _measure(cls, n) > 1:
+                    w = w[:n]
+                    cls = cls[:n]
+                break
+
+    # Step 5
+
+    if w[-1] == "e" and len(w) > 1:
+        n = len(w) - 1
+        if _measure(cls, n) > 1 or (_is_meq1(cls, n) and not _is_cvc(w, cls, n)):
+            w = w[:n]
+            cls = cls[:n]
+
+    if w[-1] == "l" and w[-2:] == "ll" and _measure(cls, len(w)) > 1:
+        w = w[:-1]
+
+    if first_is_y:
+        w = "y" + w[1:]
+
+    return w
+
+backends = {
+            "regex": stem,
+            "fast": stem_fast,
+            }
+
 if __name__ == '__main__':
     print(stem("fundamentally"))
 